@@ -0,0 +1,134 @@
+"""
+Per-article slicing of a rendered publication.
+
+Each top-level `{% content %}` include is marked with an anchor on its
+first element. Once the publication is laid out, the pages holding the
+anchors give the page range of every article, and each range is written
+as its own PDF from the same layout.
+"""
+
+import copy
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ANCHOR_PREFIX = "geraldmag-article-"
+
+# First start tag of a fragment, and its id attribute if any
+START_TAG_RE = re.compile(r"<([a-zA-Z][\w-]*)([^>]*)>")
+ID_RE = re.compile(r"""\sid\s*=\s*["']?([^"'\s>]+)""", re.IGNORECASE)
+
+# Elements that do not generate boxes, so cannot hold an anchor
+HIDDEN_TAGS = {"link", "meta", "script", "style", "template", "title"}
+
+
+@dataclass
+class Article:
+    """
+    A top-level content include of the publication.
+    """
+
+    path: Path
+    anchor: str
+    title: Optional[str] = None
+    # Time spent processing the content, in seconds
+    render_time: float = 0.0
+
+    @property
+    def name(self) -> str:
+        """Name of the article, from its file or its directory."""
+        if self.path.stem == "index":
+            return self.path.parent.name
+        return self.path.stem
+
+
+def mark_article(html: str, index: int) -> Tuple[str, Optional[str]]:
+    """
+    Anchor the first element of an article fragment.
+
+    The anchor is put on the article's own first element rather than on an
+    extra one, so that it lands on the page the article starts on even when
+    that element forces a page break.
+
+    Args:
+        html: HTML fragment of the article
+        index: Index of the article in the publication
+
+    Returns:
+        Tuple of the fragment and the anchor, None if the fragment has no
+        element to anchor
+    """
+    for match in START_TAG_RE.finditer(html):
+        if match[1].lower() in HIDDEN_TAGS:
+            continue
+        existing = ID_RE.search(match[2])
+        if existing:
+            return html, existing[1]
+        anchor = f"{ANCHOR_PREFIX}{index}"
+        end = match.start(2)
+        return f'{html[:end]} id="{anchor}"{html[end:]}', anchor
+    return html, None
+
+
+def page_ranges(
+    pages: List[Any], articles: List[Article]
+) -> List[Tuple[Article, int, int]]:
+    """
+    Find the pages of the articles in a rendered document.
+
+    An article runs from the page of its anchor to the page before the next
+    article, or to the page of the next article when both start on the same
+    page.
+
+    Args:
+        pages: Pages of the rendered document
+        articles: Articles of the publication
+
+    Returns:
+        List of (article, first page, last page) triples, pages counted from
+        0; articles not found in the document are left out
+    """
+    starts: Dict[str, int] = {}
+    for number, page in enumerate(pages):
+        for anchor in page.anchors:
+            starts.setdefault(anchor, number)
+
+    found = [
+        (article, starts[article.anchor])
+        for article in articles
+        if article.anchor in starts
+    ]
+    ranges: List[Tuple[Article, int, int]] = []
+    for position, (article, first) in enumerate(found):
+        if position + 1 < len(found):
+            last = max(first, found[position + 1][1] - 1)
+        else:
+            last = len(pages) - 1
+        ranges.append((article, first, last))
+    return ranges
+
+
+def slice_document(
+    document: Any, article: Article, first: int, last: int
+) -> Any:
+    """
+    Take the pages of an article out of a rendered document.
+
+    Bookmarks follow their pages; the metadata is copied and given the
+    title of the article.
+
+    Args:
+        document: Rendered WeasyPrint document
+        article: Article to take out
+        first: First page of the article
+        last: Last page of the article
+
+    Returns:
+        New WeasyPrint document holding the pages of the article
+    """
+    sliced = document.copy(document.pages[first : last + 1])
+    sliced.metadata = copy.copy(document.metadata)
+    if article.title:
+        sliced.metadata.title = article.title
+    return sliced
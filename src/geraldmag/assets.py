@@ -2,10 +2,214 @@
 Asset management classes for GéraldMag.
 """
 
+import html
+import os
+import re
+import urllib.request
+from concurrent.futures import Executor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
 
 import nanoid
+import sass  # type: ignore
+
+from .cache import PArtifactCache, artifact_key
+from .fsutil import atomic_write
+
+# Compiled styles are cached with this placeholder instead of the scope, as
+# scopes change on every build
+SCOPE_PLACEHOLDER = "__geraldmag_scope__"
+
+# Rules that Sass only accepts at the top level of a stylesheet, kept out of
+# the scope block
+TOP_LEVEL_RULE_RE = re.compile(
+    r"^[ \t]*@(?:charset|forward|use)\b[^;]*;", re.M
+)
+
+# Blocks, statements, strings and comments of compiled CSS
+CSS_TOKEN_RE = re.compile(
+    r""""(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*.*?\*/|[{};]""", re.S
+)
+
+# At-rules whose blocks hold rules, where the scope selector belongs; in the
+# others (@font-face, @page...) it is not valid
+CONDITIONAL_AT_RULES = ("@container", "@layer", "@media", "@supports")
+
+# Images of HTML content, and resources of stylesheets
+IMG_SRC_RE = re.compile(
+    r"""(<img\b[^>]*?\bsrc=)(?:"([^"]*)"|'([^']*)'|([^\s>]+))""",
+    re.IGNORECASE,
+)
+CSS_URL_RE = re.compile(r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^)\s]*))\s*\)""")
+
+# Sass imports: the rule, then each quoted URL it imports
+SASS_IMPORT_RE = re.compile(r"@import\s+([^;]+);")
+SASS_IMPORT_URL_RE = re.compile(r"""["']([^"']+)["']""")
+
+# Resources of stylesheets served from the font bucket
+FONT_SUFFIXES = {".otf", ".ttf", ".woff", ".woff2"}
+
+
+def unscope_at_rules(css: str, selector: str) -> str:
+    """
+    Take the declarations of at-rules out of the scope selector.
+
+    Sass bubbles the at-rules of a scope block up, and puts their
+    declarations in the scope selector: `@font-face { [data-scope] { ... } }`
+    is not valid CSS, the selector is removed from the at-rules that do not
+    hold rules.
+
+    Args:
+        css: Compiled CSS
+        selector: Scope selector
+
+    Returns:
+        CSS with valid at-rules
+    """
+    parts: List[str] = []
+    # Header of each open block, and whether its braces are removed
+    stack: List[Tuple[str, bool]] = []
+    # End of the copied CSS, and start of the current header
+    position = boundary = 0
+    for match in CSS_TOKEN_RE.finditer(css):
+        token = match[0]
+        if token == "{":
+            header = css[boundary : match.start()].strip()
+            parent = stack[-1][0] if stack else ""
+            unscoped = (
+                header == selector
+                and parent.startswith("@")
+                and not parent.startswith(CONDITIONAL_AT_RULES)
+            )
+            if unscoped:
+                parts.append(css[position:boundary])
+            else:
+                parts.append(css[position : match.end()])
+            stack.append((header, unscoped))
+            position = match.end()
+        elif token == "}":
+            unscoped = stack.pop()[1] if stack else False
+            parts.append(
+                css[position : match.start() if unscoped else match.end()]
+            )
+            position = match.end()
+        elif token != ";":
+            continue
+        boundary = match.end()
+    parts.append(css[position:])
+    return "".join(parts)
+
+
+def local_asset(url: str, base_dir: Path) -> Optional[Path]:
+    """
+    Resolve the URL of a local asset, the way the build does.
+
+    Relative URLs are relative to the file referencing them (content file
+    or stylesheet), not to the consolidated HTML in the build directory.
+
+    Args:
+        url: URL, as written in the file
+        base_dir: Directory of the file referencing the URL
+
+    Returns:
+        Path to the asset, None for remote, data:, fragment-only and
+        other non-file URLs
+    """
+    parsed = urlparse(url)
+    if parsed.scheme or parsed.netloc or not parsed.path:
+        return None
+    # Query strings and fragments are not part of the file name
+    return base_dir / urllib.request.url2pathname(parsed.path)
+
+
+def resolve_import(url: str, base_dirs: List[Path]) -> Optional[Path]:
+    """
+    Resolve a Sass `@import` to the file it imports: the partial (`_name`)
+    or the file itself, `.scss`, `.sass` or `.css`, else an index file.
+
+    Args:
+        url: Imported URL, as written in the style
+        base_dirs: Directories to resolve it from, in order
+
+    Returns:
+        Path to the imported file, None for plain CSS imports (remote or
+        `.css` URLs) and for URLs that cannot be resolved
+    """
+    if urlparse(url).scheme or url.lower().endswith(".css"):
+        return None
+    for base_dir in base_dirs:
+        target = base_dir / url
+        if target.suffix.lower() in (".scss", ".sass"):
+            candidates = [target.with_name(f"_{target.name}"), target]
+        else:
+            candidates = [
+                target.with_name(f"{prefix}{target.name}{suffix}")
+                for suffix in (".scss", ".sass", ".css")
+                for prefix in ("_", "")
+            ] + [target / "_index.scss", target / "index.scss"]
+        for candidate in candidates:
+            if candidate.is_file():
+                return candidate
+    return None
+
+
+def style_imports(source: str, include_path: Path) -> List[Path]:
+    """
+    Find the files a style imports, directly or through other imports.
+
+    Imports are resolved with `resolve_import`, which `compile_scss` makes
+    libsass use too: the files found are those the compilation reads.
+
+    Args:
+        source: SCSS source
+        include_path: Directory of the style
+
+    Returns:
+        Paths to the imported files, in the order they are first imported
+    """
+    imports: Dict[Path, None] = {}
+    pending = [(source, include_path)]
+    while pending:
+        text, base_dir = pending.pop()
+        for rule in SASS_IMPORT_RE.findall(text):
+            for url in SASS_IMPORT_URL_RE.findall(rule):
+                path = resolve_import(url, [base_dir, include_path])
+                if path is None:
+                    continue
+                path = Path(os.path.normpath(path))
+                if path in imports:
+                    continue
+                imports[path] = None
+                pending.append((path.read_text(encoding="utf-8"), path.parent))
+    return list(imports)
+
+
+def compile_scss(source: str, include_path: str) -> str:
+    """
+    Compile SCSS source (module level so that it can run in a worker
+    process, libsass holds the GIL).
+
+    Args:
+        source: SCSS source
+        include_path: Directory to resolve imports from
+
+    Returns:
+        Compiled CSS
+    """
+
+    def importer(url: str, prev: str) -> Optional[List[Tuple[str]]]:
+        # The source itself is "stdin"; imported files are absolute paths
+        base_dir = Path(include_path) if prev == "stdin" else Path(prev).parent
+        path = resolve_import(url, [base_dir, Path(include_path)])
+        return None if path is None else [(str(path),)]
+
+    return sass.compile(  # type: ignore
+        string=source,
+        include_paths=[include_path],
+        output_style="expanded",
+        importers=[(0, importer)],
+    )
 
 
 class StyleCompiler:
@@ -15,26 +219,191 @@ class StyleCompiler:
 
     def __init__(self):
         """Initialize the style compiler."""
-        self._styles = []
+        self._styles: List[Tuple[Path, Optional[str]]] = []
+        self._registered: Set[Tuple[Path, Optional[str]]] = set()
+        self._compiled: Dict[int, str] = {}
+        self.css: Optional[str] = None
+        self.cache: Optional[PArtifactCache] = None
+        # Buckets serving the images and fonts referenced by the styles
+        self.images: Optional["ImageBucket"] = None
+        self.fonts: Optional["FontBucket"] = None
+        # Called with the index of each new style, to compile it early
+        self.on_add: Optional[Callable[[int], None]] = None
 
     def add_style(self, path: Path, scope: Optional[str] = None) -> None:
         """
         Add a style file to be compiled.
 
+        Registering the same file twice with the same scope does nothing.
+
         Args:
             path: Path to the style file (CSS or SCSS)
             scope: Optional scope to apply to the styles
         """
-        pass
+        style = (path.absolute().resolve(), scope)
+        if style in self._registered:
+            return
+        self._registered.add(style)
+        self._styles.append(style)
+        if self.on_add is not None:
+            self.on_add(len(self._styles) - 1)
+
+    def style_size(self, index: int) -> int:
+        """
+        Return the size of the source of a registered style, in bytes.
+
+        Args:
+            index: Index of the style, in registration order
+        """
+        return self._styles[index][0].stat().st_size
+
+    def usage(self) -> Dict[Path, Tuple[int, int]]:
+        """
+        Return how often each style file was registered.
+
+        A file registered with several scopes is compiled, and ends up in
+        the CSS, once per scope.
+
+        Returns:
+            Number of registrations and total compiled size (in bytes, 0
+            until compiled) by style file
+        """
+        usage: Dict[Path, Tuple[int, int]] = {}
+        for index, (path, _) in enumerate(self._styles):
+            count, size = usage.get(path, (0, 0))
+            compiled = len(self._compiled.get(index, "").encode("utf-8"))
+            usage[path] = (count + 1, size + compiled)
+        return usage
+
+    def compile_style(
+        self, index: int, executor: Optional[Executor] = None
+    ) -> str:
+        """
+        Compile a single registered style, once.
+
+        Args:
+            index: Index of the style, in registration order
+            executor: Optional executor to run libsass in
+
+        Returns:
+            Compiled CSS
+        """
+        if index not in self._compiled:
+            path, scope = self._styles[index]
+            css = self._compile_style(path, scope, executor)
+            self._compiled[index] = self._link_urls(css, path.parent)
+        return self._compiled[index]
 
     def compile(self, output_path: Path):
         """
         Compile all registered styles into a single CSS file.
 
+        The compiled CSS is also kept in memory (see `css`) so that the PDF
+        stage does not have to read it back.
+
         Args:
             output_path: Path to write the compiled CSS
         """
-        pass
+        self.css = "\n".join(
+            self.compile_style(index) for index in range(len(self._styles))
+        )
+        atomic_write(output_path, self.css)
+
+    def _compile_style(
+        self, path: Path, scope: Optional[str], executor: Optional[Executor]
+    ) -> str:
+        """
+        Compile a single style file, enclosing it in its scope if any.
+
+        Compiled SCSS is cached by the content of the style and of the
+        files it imports, wherever they are. At-rules that cannot hold the
+        scope (`@font-face`, `@page`...) are not scoped, they apply to the
+        whole publication.
+
+        Args:
+            path: Path to the style file (CSS or SCSS)
+            scope: Optional scope to apply to the styles
+            executor: Optional executor to run libsass in
+
+        Returns:
+            Compiled CSS
+        """
+        source = path.read_text(encoding="utf-8")
+        if scope is None and path.suffix.lower() == ".css":
+            return source
+        if scope is not None:
+            rules = TOP_LEVEL_RULE_RE.findall(source)
+            body = TOP_LEVEL_RULE_RE.sub("", source)
+            source = "".join(f"{rule}\n" for rule in rules) + (
+                f'[data-scope="{SCOPE_PLACEHOLDER}"] {{\n{body}\n}}'
+            )
+
+        key = None
+        cached: Optional[bytes] = None
+        if self.cache is not None:
+            # Imported files are named relative to the style, so that
+            # machines sharing the cache share the key
+            key = artifact_key(
+                "style",
+                sass.__version__,  # type: ignore
+                source,
+                *(
+                    os.path.relpath(p, path.parent)
+                    + "\0"
+                    + p.read_text("utf-8")
+                    for p in style_imports(source, path.parent)
+                ),
+            )
+            cached = self.cache.get(key)
+
+        if cached is not None:
+            css = cached.decode("utf-8")
+        else:
+            if executor is not None:
+                css = executor.submit(
+                    compile_scss, source, str(path.parent)
+                ).result()
+            else:
+                css = compile_scss(source, str(path.parent))
+            if self.cache is not None and key is not None:
+                self.cache.put(key, css.encode("utf-8"))
+        if scope is None:
+            return css
+        # Sass puts the declarations of at-rules in the scope selector
+        css = unscope_at_rules(css, f'[data-scope="{SCOPE_PLACEHOLDER}"]')
+        return css.replace(SCOPE_PLACEHOLDER, scope)
+
+    def _link_urls(self, css: str, base_dir: Path) -> str:
+        """
+        Point the local resources of compiled CSS to the asset buckets.
+
+        The compiled CSS is served from the `styles` directory of the
+        build, local resources are registered with the font or the image
+        bucket instead of being resolved from there.
+
+        Args:
+            css: Compiled CSS
+            base_dir: Directory of the style file
+
+        Returns:
+            CSS with the URLs of the registered resources
+        """
+        if self.images is None or self.fonts is None:
+            return css
+        images = self.images
+        fonts = self.fonts
+
+        def link(match: re.Match[str]) -> str:
+            url = match[1] or match[2] or match[3] or ""
+            path = local_asset(url, base_dir)
+            if path is None or not path.is_file():
+                return match[0]
+            if path.suffix.lower() in FONT_SUFFIXES:
+                return f'url("../fonts/{fonts.register_font(path)}")'
+            image_id = images.register_image(path)
+            return f'url("../images/{images.filename(image_id)}")'
+
+        return CSS_URL_RE.sub(link, css)
 
 
 class ImageBucket:
@@ -44,28 +413,82 @@ class ImageBucket:
 
     def __init__(self):
         """Initialize the image bucket."""
-        self._images = {}
+        self._images: Dict[str, Path] = {}
+        self._ids: Dict[Path, str] = {}
 
     def register_image(self, path: Path) -> str:
         """
         Register an image for processing and generate a unique ID.
 
+        Registering the same file twice returns the same ID.
+
         Args:
             path: Path to the image file
 
         Returns:
             Unique ID for the image
         """
-        return nanoid.generate()
+        path = path.absolute().resolve()
+        if path not in self._ids:
+            image_id = nanoid.generate()
+            self._ids[path] = image_id
+            self._images[image_id] = path
+        return self._ids[path]
+
+    def filename(self, image_id: str) -> str:
+        """
+        Return the name under which an image is published in the build.
+
+        Args:
+            image_id: ID returned by `register_image`
+
+        Returns:
+            File name of the image inside the `images` directory
+        """
+        return f"{image_id}{self._images[image_id].suffix.lower()}"
 
-    def copy_images(self, output_dir: Path):
+    def lookup(self, filename: str) -> Optional[Path]:
         """
-        Copy all registered images to the output directory.
+        Find the source file of a published image.
 
         Args:
-            output_dir: Directory to copy images to
+            filename: File name of the image inside the `images` directory
+
+        Returns:
+            Path to the source image, or None if it is not registered
         """
-        pass
+        path = self._images.get(Path(filename).stem)
+        if path is None or path.suffix.lower() != Path(filename).suffix:
+            return None
+        return path
+
+    def paths(self) -> List[Path]:
+        """Return the source files of the registered images."""
+        return list(self._images.values())
+
+    def link_images(self, html_content: str, base_dir: Path) -> str:
+        """
+        Register the local images of HTML content and point them to the
+        bucket.
+
+        Args:
+            html_content: HTML content
+            base_dir: Directory of the content file, relative image URLs
+                are relative to it
+
+        Returns:
+            HTML content with the URLs of the registered images
+        """
+
+        def link(match: re.Match[str]) -> str:
+            url = match[2] or match[3] or match[4] or ""
+            path = local_asset(html.unescape(url), base_dir)
+            if path is None or not path.is_file():
+                return match[0]
+            filename = self.filename(self.register_image(path))
+            return f'{match[1]}"images/{filename}"'
+
+        return IMG_SRC_RE.sub(link, html_content)
 
 
 class FontBucket:
@@ -75,25 +498,41 @@ class FontBucket:
 
     def __init__(self):
         """Initialize the font bucket."""
-        self._fonts = {}
+        self._fonts: Dict[str, Path] = {}
+        self._ids: Dict[Path, str] = {}
 
-    def register_font(self, path: Path):
+    def register_font(self, path: Path) -> str:
         """
-        Register a font for processing.
+        Register a font for processing and generate a unique ID.
+
+        Registering the same file twice returns the same ID; files with the
+        same name in different directories get different IDs.
 
         Args:
             path: Path to the font file
 
         Returns:
-            ID for the font
+            Unique ID for the font, which is also its file name in the build
         """
-        pass
+        path = path.absolute().resolve()
+        if path not in self._ids:
+            font_id = f"{nanoid.generate()}{path.suffix.lower()}"
+            self._ids[path] = font_id
+            self._fonts[font_id] = path
+        return self._ids[path]
 
-    def copy_fonts(self, output_dir: Path):
+    def lookup(self, font_id: str) -> Optional[Path]:
         """
-        Copy all registered fonts to the output directory.
+        Find the source file of a registered font.
 
         Args:
-            output_dir: Directory to copy fonts to
+            font_id: ID returned by `register_font`
+
+        Returns:
+            Path to the font file, or None if it is not registered
         """
-        pass
+        return self._fonts.get(font_id)
+
+    def paths(self) -> List[Path]:
+        """Return the source files of the registered fonts."""
+        return list(self._fonts.values())
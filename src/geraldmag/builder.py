@@ -2,9 +2,23 @@
 Builder class for GéraldMag.
 """
 
+import asyncio
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .articles import Article, page_ranges, slice_document
 from .context import Context
 from .engine import Engine
 from .env import PublicationEnvironment
+from .fetcher import AssetFetcher
+from .fsutil import FileLock, atomic_open, atomic_write
+from .memory import peak_rss
+from .preflight import Preflight, PreflightError
+from .profiles import OutputProfile, get_profiles
+from .report import build_report, write_report
+from .scheduler import TaskGraph
+from .workers import WorkerPool
 
 
 class Builder:
@@ -12,57 +26,289 @@ class Builder:
     Manages the build process for a publication.
     """
 
-    def __init__(self, env: PublicationEnvironment):
+    def __init__(
+        self, env: PublicationEnvironment, pool: Optional[WorkerPool] = None
+    ):
         """
         Initialize a new Builder.
 
         Args:
-            publication_name: Name of the publication to build
             env: Environment configuration
+            pool: Worker processes to run the CPU-bound steps in (styles,
+                Markdown, figures), kept after the build; by default the
+                builder starts its own and stops it after the build
         """
         self.env = env
-        self.context = Context(env, "publication_name")  # TODO
+        self._own_pool = pool is None
+        self.pool = pool or WorkerPool(env.workers)
+        self.context = Context(env, env.publication_name, pool=self.pool)
         self.engine = Engine(self.context)
+        self.build_path = env.build_dir.absolute / env.publication_name
+        self.profiles = get_profiles(env)
+        # <publication>.pdf, or <publication>-<profile>.pdf with profiles
+        self.output_files = {
+            profile.name: env.output_dir.absolute
+            / f"{_join('-', env.publication_name, profile.name)}.pdf"
+            for profile in self.profiles
+        }
+        self.output_file = self.output_files[self.profiles[0].name]
+        self.article_files: List[Path] = []
+        self.report_files = (
+            env.output_dir.absolute / f"{env.publication_name}-report.json",
+            env.output_dir.absolute / f"{env.publication_name}-report.html",
+        )
+        self.fetcher = AssetFetcher(self.context, self.build_path)
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        # Peak RSS over the lifetime of the process, and the largest of its
+        # terminated worker processes, in bytes: in a daemon worker, they
+        # cover every job it ran, not this build alone
+        self.process_peak_rss: Optional[int] = None
+        self.children_peak_rss: Optional[int] = None
 
     def clean(self):
         """
         Clean the output directories before building.
+
+        Removes the build directory of the publication and its outputs (the
+        PDF of every output profile, their article PDFs and the report),
+        under the build lock. The artifact cache is kept.
         """
-        # Implementation for cleaning output directories
-        pass
+        with FileLock(self._lock_file()):
+            shutil.rmtree(self.build_path, ignore_errors=True)
+            for output_file in self.output_files.values():
+                output_file.unlink(missing_ok=True)
+                shutil.rmtree(
+                    output_file.with_name(f"{output_file.stem}-articles"),
+                    ignore_errors=True,
+                )
+            for report_file in self.report_files:
+                report_file.unlink(missing_ok=True)
 
-    def build(self):
+    def build(self) -> Path:
         """
         Build the publication into a PDF.
 
-        Args:
-            clean: If True, clean output directories before building
-            output_path: Optional custom output path for the PDF
-
         Returns:
-            Path to the generated PDF file
+            Path to the generated PDF file (of the first output profile)
+
+        Raises:
+            PreflightError: If the pre-flight checks find missing files
+        """
+        if self.env.preflight:
+            issues = Preflight(self.engine).run()
+            if issues:
+                raise PreflightError(issues)
+
+        try:
+            with FileLock(self._lock_file()):
+                asyncio.run(self._run_stages())
+                self.context.cache.flush()
+        finally:
+            if self._own_pool:
+                self.pool.shutdown()
+        self.process_peak_rss = peak_rss()
+        self.children_peak_rss = peak_rss(children=True)
+        return self.output_file
+
+    def _lock_file(self) -> Path:
+        """
+        Return the lock file of the build directory.
+
+        Only one build in a given build directory at a time, however it is
+        reached (relative path, symbolic link...); the lock lives outside
+        build_path so that cleaning does not remove it.
         """
-        # Build process steps
-        self._build_html()
-        self._compile_scss()
-        self._generate_pdf()
+        build_path = self.build_path.resolve()
+        return build_path.parent / f".{build_path.name}.lock"
+
+    async def _run_stages(self):
+        """
+        Run the build stages as a task graph.
+
+        Styles are compiled as soon as they are registered, while the
+        templates are still rendering; the layout waits for all of them.
+        The publication and, with `split_articles`, each of its articles
+        are then written in parallel from that single layout, once per
+        output profile. Only profiles with different image settings need
+        a layout of their own.
+        """
+        graph = TaskGraph(self.env.workers, self.env.memory_budget * 2**20)
+        styles = self.context.styles
+
+        def on_add(index: int) -> None:
+            # libsass holds the GIL, styles compile in the worker processes;
+            # rough estimate of the memory needed by libsass
+            memory = styles.style_size(index) * 20
+            graph.add_threadsafe(
+                f"style:{index}",
+                styles.compile_style,
+                index,
+                self.pool.executor,
+                memory=memory,
+            )
+
+        styles.on_add = on_add
+        try:
+            await graph.wait(graph.add("html", self._build_html))
+            # No more styles after the render; those registered during
+            # the render may still be compiling
+            style_tasks = [n for n in graph.names() if n != "html"]
+            graph.add("styles", self._compile_scss, deps=style_tasks)
+            groups: Dict[Any, List[OutputProfile]] = {}
+            for profile in self.profiles:
+                options = profile.layout_options()
+                groups.setdefault(options, []).append(profile)
+            layouts: List[Tuple[str, List[OutputProfile]]] = []
+            for options, group in groups.items():
+                name = _join(":", "layout", "+".join(p.name for p in group))
+                graph.add(
+                    name, self._render_pdf, dict(options), deps=["styles"]
+                )
+                layouts.append((name, group))
+
+            self.article_files = []
+            for name, group in layouts:
+                (document,) = await graph.wait(name)
+                for profile in group:
+                    self._write_profile(graph, document, profile)
+            await graph.join()
+        finally:
+            styles.on_add = None
+            graph.close()
+            self.timings = graph.timings
 
     def _build_html(self):
         """
         Build the HTML structure from the publication content.
         """
-        pass
+        # Entry point styles come first so that scoped styles override them
+        for style in self.env.main_styles():
+            self.context.styles.add_style(style)
+
+        entrypoint = self.env.publication_root.absolute / self.env.entrypoint
+        spool = self.context.spool
+        if spool is None:
+            html = self.engine.process(entrypoint)
+            atomic_write(self.build_path / "index.html", html)
+            return
+
+        # Low-memory mode: the HTML is streamed to disk, never held whole
+        try:
+            with atomic_open(self.build_path / "index.html") as f:
+                spool.write_expanded(self.engine.generate(entrypoint), f)
+        finally:
+            spool.close()
 
     def _compile_scss(self):
         """
         Compile SCSS files to CSS.
         """
-        pass
+        self.context.styles.compile(self.build_path / "styles" / "main.css")
 
-    def _generate_pdf(
+    def _render_pdf(self, options: Dict[str, Any]) -> Any:
+        """
+        Lay the publication out from HTML and CSS.
+
+        Every resource requested by WeasyPrint goes through the AssetFetcher,
+        which answers from the asset buckets instead of the build directory.
+
+        Args:
+            options: WeasyPrint layout options of the output profiles
+
+        Returns:
+            Rendered WeasyPrint document
+        """
+        # Imported here so that the commands not building anything do not
+        # load WeasyPrint and its native libraries
+        import weasyprint
+
+        html = weasyprint.HTML(
+            filename=self.build_path / "index.html",
+            url_fetcher=self.fetcher,
+        )
+        return html.render(**options)
+
+    def _write_profile(
+        self, graph: TaskGraph, document: Any, profile: OutputProfile
+    ):
+        """
+        Add the tasks writing the PDFs of an output profile to the graph.
+
+        Args:
+            graph: Task graph of the build
+            document: Rendered WeasyPrint document of the publication
+            profile: Output profile
+        """
+        output_file = self.output_files[profile.name]
+        # WeasyPrint collects the fonts of a document, and subsets them in
+        # place, while writing it: profiles sharing a layout each write
+        # their own copy of the document, which starts with no fonts
+        pdf_task = graph.add(
+            _join(":", "pdf", profile.name),
+            profile.write,
+            document.copy(),
+            output_file,
+        )
+        articles: List[Article] = self.context.articles
+        ranges = page_ranges(document.pages, articles)
+        # The report is about the first profile
+        if self.env.report and profile is self.profiles[0]:
+            graph.add(
+                "report",
+                self._write_report,
+                output_file,
+                ranges,
+                len(document.pages),
+                graph.timings_snapshot,
+                deps=[pdf_task],
+            )
+        if not self.env.split_articles:
+            return
+
+        articles_path = output_file.with_name(f"{output_file.stem}-articles")
+        width = len(str(len(ranges)))
+        article_files = [
+            articles_path / f"{number:0{width}}-{article.name}.pdf"
+            for number, (article, _, _) in enumerate(ranges, 1)
+        ]
+        # Remove the articles of previous builds that are gone
+        if articles_path.exists():
+            for stale in articles_path.glob("*.pdf"):
+                if stale not in article_files:
+                    stale.unlink(missing_ok=True)
+
+        for output_file, (article, first, last) in zip(article_files, ranges):
+            graph.add(
+                _join(":", "article", profile.name, output_file.stem),
+                profile.write,
+                slice_document(document, article, first, last),
+                output_file,
+            )
+        self.article_files.extend(article_files)
+
+    def _write_report(
         self,
+        pdf_file: Path,
+        ranges: List[Tuple[Article, int, int]],
+        page_count: int,
+        timings: Callable[[], Dict[str, Tuple[float, float]]],
     ):
         """
-        Generate the PDF from HTML and CSS.
+        Write the build report, as JSON and HTML.
+
+        Args:
+            pdf_file: Path to the PDF of the publication
+            ranges: Articles with their first and last page
+            page_count: Number of pages of the publication
+            timings: Function returning a snapshot of the start and end
+                time of the build stages so far
         """
-        pass
+        report = build_report(
+            self.context, pdf_file, ranges, page_count, timings()
+        )
+        write_report(report, *self.report_files)
+
+
+def _join(separator: str, *names: str) -> str:
+    """Join the non-empty names (the default output profile has none)."""
+    return separator.join(filter(None, names))
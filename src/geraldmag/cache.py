@@ -0,0 +1,275 @@
+"""
+Artifact cache for GéraldMag.
+
+Build artifacts (converted Markdown, compiled styles, ...) are stored under
+content-addressed keys, first in a local cache inside `build_dir`, then in
+an optional shared backend: a directory (e.g. on NFS) or an HTTP store
+answering `GET` and `PUT` on `<base_url>/<key>`.
+"""
+
+import hashlib
+import queue
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Optional, Protocol, Tuple
+from urllib.parse import urlparse
+
+from .env import Environment
+from .fsutil import atomic_write
+
+
+def artifact_key(kind: str, *parts: str | bytes) -> str:
+    """
+    Compute the content-addressed key of an artifact.
+
+    Args:
+        kind: Kind of artifact (namespaces the keys)
+        *parts: Everything the artifact depends on
+
+    Returns:
+        Hexadecimal SHA-256 key
+    """
+    digest = hashlib.sha256(kind.encode("utf-8"))
+    for part in parts:
+        data = part.encode("utf-8") if isinstance(part, str) else part
+        # Length prefix so that ("ab", "c") and ("a", "bc") differ
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class PArtifactCache(Protocol):
+    """
+    Protocol defining the interface for artifact cache backends.
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return the artifact stored under a key, or None on a miss.
+        """
+        ...
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Store an artifact under a key.
+        """
+        ...
+
+
+class DirectoryCache:
+    """
+    Artifact cache stored in a directory, local or shared (e.g. NFS).
+
+    Artifacts are written atomically, so reads need no lock. Keys being
+    content-addressed, concurrent writers of a key write the same bytes and
+    writes need no lock either.
+    """
+
+    def __init__(self, root: Path):
+        """
+        Initialize the directory cache.
+
+        Args:
+            root: Directory holding the artifacts
+        """
+        self.root = root
+
+    def _path(self, key: str) -> Path:
+        """Return the path of the artifact stored under a key."""
+        return self.root / key[:2] / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return the artifact stored under a key, or None on a miss.
+        """
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Store an artifact under a key.
+        """
+        path = self._path(key)
+        if path.exists():
+            # Content-addressed: an existing artifact is already right
+            return
+        atomic_write(path, data)
+
+
+class HTTPCache:
+    """
+    Artifact cache stored on an HTTP server accepting `GET` and `PUT`.
+
+    Network errors are treated as cache misses, the build goes on without
+    the shared cache.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10):
+        """
+        Initialize the HTTP cache.
+
+        Args:
+            base_url: URL under which artifacts are stored
+            timeout: Network timeout in seconds
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return the artifact stored under a key, or None on a miss.
+        """
+        try:
+            with urllib.request.urlopen(
+                f"{self.base_url}/{key}", timeout=self.timeout
+            ) as response:
+                return response.read()
+        except (urllib.error.URLError, OSError):
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Store an artifact under a key.
+        """
+        request = urllib.request.Request(
+            f"{self.base_url}/{key}", data=data, method="PUT"
+        )
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except (urllib.error.URLError, OSError):
+            pass
+
+
+class ArtifactCache:
+    """
+    Two-level artifact cache: a local directory in front of an optional
+    shared backend.
+
+    Reads go through the local cache and fall back to the shared one,
+    populating the local cache on the way (read-through). Writes land in
+    the local cache immediately and are sent to the shared backend by a
+    background thread (write-back); `flush` waits for them.
+    """
+
+    def __init__(
+        self, local: DirectoryCache, shared: Optional[PArtifactCache] = None
+    ):
+        """
+        Initialize the artifact cache.
+
+        Args:
+            local: Local cache
+            shared: Optional shared backend
+        """
+        self.local = local
+        self.shared = shared
+        self._pending: queue.Queue[Optional[Tuple[str, bytes]]] = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        # Set when the write-back thread died: writes are then synchronous
+        self._failed = False
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def create(cls, env: Environment) -> "ArtifactCache":
+        """
+        Create the artifact cache configured in an environment.
+
+        Args:
+            env: Environment configuration
+
+        Returns:
+            Configured ArtifactCache instance
+        """
+        local = DirectoryCache(env.build_dir.absolute / ".cache")
+        shared: Optional[PArtifactCache] = None
+        if env.artifact_cache:
+            url = urlparse(env.artifact_cache)
+            if url.scheme in ("http", "https"):
+                shared = HTTPCache(env.artifact_cache)
+            elif url.scheme == "file":
+                shared = DirectoryCache(Path(url.path))
+            else:
+                shared = DirectoryCache(Path(env.artifact_cache).absolute())
+        return cls(local, shared)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return the artifact stored under a key, or None on a miss.
+        """
+        data = self.local.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+        if self.shared is not None:
+            data = self.shared.get(key)
+            if data is not None:
+                self.shared_hits += 1
+                self.local.put(key, data)
+                return data
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        Store an artifact under a key.
+        """
+        self.local.put(key, data)
+        if self.shared is not None:
+            if self._failed:
+                self._drain()
+                self.shared.put(key, data)
+                return
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_back, daemon=True
+                )
+                self._writer.start()
+            self._pending.put((key, data))
+
+    def flush(self) -> None:
+        """
+        Wait until all artifacts have been sent to the shared backend.
+        """
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._failed:
+            self._drain()
+
+    def _write_back(self) -> None:
+        """
+        Send pending artifacts to the shared backend.
+
+        If the backend raises, the thread stops and the artifacts still
+        pending, and those stored afterwards, are sent synchronously.
+        """
+        assert self.shared is not None
+        try:
+            while (item := self._pending.get()) is not None:
+                self.shared.put(*item)
+        except Exception as e:
+            print(
+                f"Warning: Shared cache write-back failed ({e}), "
+                "writing synchronously"
+            )
+            self._failed = True
+
+    def _drain(self) -> None:
+        """
+        Send the artifacts left by the write-back thread synchronously.
+        """
+        assert self.shared is not None
+        while True:
+            try:
+                item = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self.shared.put(*item)
@@ -3,27 +3,38 @@ Build command for GéraldMag.
 """
 
 from pathlib import Path
+from typing import Sequence
 
 import click
 
 from ..builder import Builder
 from ..env import EnvPath, PublicationEnvironment
+from ..preflight import PreflightError
+from ..scheduler import stage_timeline
 
 
-def build_process(
+def create_environment(
     publication_name: str,
-    clean: bool = False,
     output_path: str | None = None,
     verbose: bool = False,
-):
+    split_articles: bool = False,
+    profiles: Sequence[str] = (),
+    report: bool = False,
+) -> PublicationEnvironment:
     """
-    Build a publication into a PDF.
+    Create the environment of a publication from the current directory.
 
     Args:
-        publication_name: Name of the publication to build
-        clean: If True, clean output directories before building
+        publication_name: Name of the publication, or relative path to it
         output_path: Optional custom output path for the PDF
         verbose: If True, show detailed logging
+        split_articles: If True, also write a PDF per article
+        profiles: Output profiles to write, instead of those of the
+            configuration
+        report: If True, also write a size and build time report
+
+    Returns:
+        Configured PublicationEnvironment instance
     """
     # publication_name may either be a relative path or the name of a
     # publication inside env.content_dir
@@ -41,10 +52,89 @@ def build_process(
         )
     if verbose:
         env.verbose = True
+    if split_articles:
+        env.split_articles = True
+    if profiles:
+        env.output_profiles = list(profiles)
+    if report:
+        env.report = True
     if output_path is not None:
         env.load({"output_path": output_path}, Path.cwd())
-    builder = Builder(env=env)
+    return env
+
+
+def build_process(
+    publication_name: str,
+    clean: bool = False,
+    output_path: str | None = None,
+    verbose: bool = False,
+    split_articles: bool = False,
+    profiles: Sequence[str] = (),
+    report: bool = False,
+):
+    """
+    Build a publication into a PDF.
+
+    Args:
+        publication_name: Name of the publication to build
+        clean: If True, clean output directories before building
+        output_path: Optional custom output path for the PDF
+        verbose: If True, show detailed logging
+        split_articles: If True, also write a PDF per article
+        profiles: Output profiles to write, instead of those of the
+            configuration
+        report: If True, also write a size and build time report
+    """
+    env = create_environment(
+        publication_name,
+        output_path,
+        verbose,
+        split_articles,
+        profiles,
+        report,
+    )
+    try:
+        builder = Builder(env=env)
+    except ValueError as e:
+        raise click.ClickException(str(e))
     if clean:
         builder.clean()
-    builder.build()
+    try:
+        builder.build()
+    except PreflightError as e:
+        for issue in e.issues:
+            click.echo(f"❌ {issue}", err=True)
+        raise click.ClickException(str(e))
+    if env.verbose:
+        click.echo("\nResources fetched by WeasyPrint:")
+        for line in builder.fetcher.stats.summary():
+            click.echo(f"  {line}")
+        click.echo("\nBuild stages (start → end, in seconds):")
+        for name, start, end in stage_timeline(builder.timings):
+            click.echo(f"  {name}: {start:.2f} → {end:.2f}")
+        if builder.process_peak_rss is not None:
+            children = (builder.children_peak_rss or 0) / 2**20
+            click.echo(
+                "\nPeak memory over the process lifetime: "
+                f"{builder.process_peak_rss / 2**20:.0f} MiB "
+                f"(terminated workers: {children:.0f} MiB)"
+            )
+        if builder.context.spool is not None:
+            click.echo(
+                f"Fragments spooled to disk: {builder.context.spool.spilled}"
+            )
+    if len(builder.output_files) > 1:
+        click.echo("\nOutput profiles written:")
+        for name, path in builder.output_files.items():
+            click.echo(f"  {name}: {path}")
+    if builder.article_files:
+        click.echo(
+            f"\n{len(builder.article_files)} article PDF(s) written to:"
+        )
+        for path in sorted({path.parent for path in builder.article_files}):
+            click.echo(f"  {path}")
+    if env.report:
+        click.echo("\nBuild report written to:")
+        for path in builder.report_files:
+            click.echo(f"  {path}")
     click.echo(f"\n✅ Publication '{publication_name}' created successfully!")
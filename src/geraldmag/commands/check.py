@@ -0,0 +1,34 @@
+"""
+Check command for GéraldMag.
+"""
+
+import click
+
+from ..builder import Builder
+from ..preflight import Preflight
+from .build import create_environment
+
+
+def check_publication(publication_name: str) -> bool:
+    """
+    Run the pre-flight checks of a publication.
+
+    Args:
+        publication_name: Name of the publication to check
+
+    Returns:
+        True if no issue was found
+    """
+    env = create_environment(publication_name)
+    try:
+        builder = Builder(env=env)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    issues = Preflight(builder.engine).run()
+    for issue in issues:
+        click.echo(f"❌ {issue}")
+    if issues:
+        click.echo(f"\n{len(issues)} issue(s) found in '{publication_name}'.")
+        return False
+    click.echo(f"✅ Publication '{publication_name}' passed all checks.")
+    return True
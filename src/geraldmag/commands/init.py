@@ -1,24 +1,57 @@
 import importlib.resources
 import os
 from pathlib import Path
+from typing import Optional
 
 import click
 import toml
 
 from .. import templates
 from ..env import Environment
+from ..scaffold import scaffold
 
 
-def init_project(force: bool = False):
+def _write_default(
+    path: Path, content: str, provided: bool, force: bool
+) -> bool:
+    """
+    Write a default project file, unless it is already there.
+
+    Args:
+        path: Path of the file
+        content: Default content of the file
+        provided: If True, the file comes from the template set, which
+            wins over the defaults even with force
+        force: If True, overwrite an existing file not from the template set
+
+    Returns:
+        True if the file was written
+    """
+    if provided:
+        click.echo(f"Kept {path} from the template.")
+        return False
+    if path.exists() and not force:
+        click.echo(
+            f"Warning: {path} already exists, skipping this file. Use --force to overwrite."
+        )
+        return False
+    with open(path, "w") as f:
+        f.write(content)
+    return True
+
+
+def init_project(force: bool = False, template: Optional[Path] = None):
     """
     Initialize a new GéraldMag project with default structure.
 
+    The template set, if any, is scaffolded first: the default files are
+    only written where it does not provide its own.
+
     Args:
         force: If True, overwrite existing files
+        template: Optional template directory (e.g. a shared house template
+            set) to scaffold the project from, on top of the defaults
     """
-    # Check if the current directory already has GéraldMag files
-    mag_toml_path = Path("mag.toml")
-
     # Access template resources using importlib.resources
     templates_path = importlib.resources.files(templates)
     init_templates = templates_path.joinpath("init")
@@ -29,59 +62,54 @@ def init_project(force: bool = False):
     # Create content directory and subdirectories
     os.makedirs("content/_default/styles", exist_ok=True)
 
-    # Create mag.toml with default configuration using Environment
     env = Environment()
-    default_config = env.dump_mandatory()
 
-    if mag_toml_path.exists() and not force:
-        click.echo(
-            "Warning: mag.toml already exists, skipping this file. Use --force to overwrite."
-        )
-    else:
-        with open(mag_toml_path, "w") as f:
-            toml.dump(default_config, f)
+    # Copy the template set, if any
+    if template is not None:
+        stats = scaffold(template, Path.cwd(), force, env.workers)
+        click.echo(f"Scaffolded from {template}: {stats.summary()}.")
+
+    def provided(path: Path) -> bool:
+        return template is not None and (template / path).is_file()
+
+    # Create mag.toml with default configuration using Environment
+    mag_toml_path = Path("mag.toml")
+    if _write_default(
+        mag_toml_path,
+        toml.dumps(env.dump_mandatory()),
+        provided(mag_toml_path),
+        force,
+    ):
         click.echo("Created mag.toml with default configuration.")
 
     # Create a default CSS file
     default_css_path = Path("content/_default/styles/main.css")
-    css_template = init_templates.joinpath("main.css")
-
-    if default_css_path.exists() and not force:
-        click.echo(
-            "Warning: Default CSS file already exists, skipping. Use --force to overwrite."
-        )
-    else:
-        with open(default_css_path, "w") as f:
-            css_content = css_template.read_text()
-            f.write(css_content)
+    if _write_default(
+        default_css_path,
+        init_templates.joinpath("main.css").read_text(),
+        provided(default_css_path),
+        force,
+    ):
         click.echo("Created default CSS file.")
 
     # Create example README file
     readme_path = Path("README.md")
-    readme_template = init_templates.joinpath("README.md")
-
-    if readme_path.exists() and not force:
-        click.echo(
-            "Warning: README.md already exists, skipping. Use --force to overwrite."
-        )
-    else:
-        with open(readme_path, "w") as f:
-            readme_content = readme_template.read_text()
-            f.write(readme_content)
+    if _write_default(
+        readme_path,
+        init_templates.joinpath("README.md").read_text(),
+        provided(readme_path),
+        force,
+    ):
         click.echo("Created README.md with basic instructions.")
 
     # Create .gitignore file
     gitignore_path = Path(".gitignore")
-    gitignore_template = init_templates.joinpath("_gitignore")
-
-    if gitignore_path.exists() and not force:
-        click.echo(
-            "Warning: .gitignore already exists, skipping. Use --force to overwrite."
-        )
-    else:
-        with open(gitignore_path, "w") as f:
-            gitignore_content = gitignore_template.read_text()
-            f.write(gitignore_content)
+    if _write_default(
+        gitignore_path,
+        init_templates.joinpath("_gitignore").read_text(),
+        provided(gitignore_path),
+        force,
+    ):
         click.echo("Created .gitignore file.")
 
     click.echo(f"\n✅ GéraldMag project initialized successfully!")
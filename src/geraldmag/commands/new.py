@@ -2,31 +2,42 @@
 Command to create a new publication in a GéraldMag project.
 """
 
+import contextlib
 import importlib.resources
-import shutil
-from importlib.abc import Traversable
 from pathlib import Path
+from typing import Optional
 
 import click
 
 from .. import templates
 from ..env import Environment
+from ..scaffold import scaffold
 
 
-def create_publication(publication_name: str, force: bool = False):
+def create_publication(
+    publication_name: str,
+    force: bool = False,
+    template: Optional[Path] = None,
+):
     """
     Create a new publication with the given name.
 
+    The publication is scaffolded from the given template directory, else
+    from the `skeleton` directory of the project's `templates_dir` if there
+    is one, else from the bundled skeleton.
+
     Args:
         publication_name: Name of the publication to create
         force: If True, overwrite existing files
+        template: Optional template directory to scaffold from
     """
     # Load environment from mag.toml
     env = Environment.create()
 
-    # Get the template directory using importlib.resources
-    templates_path = importlib.resources.files(templates)
-    skeleton_dir = templates_path.joinpath("skeleton")
+    if template is None:
+        project_skeleton = env.templates_dir.absolute / "skeleton"
+        if project_skeleton.is_dir():
+            template = project_skeleton
 
     # Create the publication directory path
     content_dir_path = env.content_dir.absolute
@@ -44,18 +55,23 @@ def create_publication(publication_name: str, force: bool = False):
     publication_dir.mkdir(parents=True, exist_ok=True)
 
     # Copy the skeleton directory structure to the new publication directory
-    # Use a function so we can leverage recursion
-    def copy_dir(src: Traversable, dst: Path):
-        dst.mkdir(parents=True, exist_ok=True)
-        for item in src.iterdir():
-            if item.is_dir():
-                copy_dir(item, dst / item.name)
-            else:
-                with item.open("rb") as src_file:
-                    with (dst / item.name).open("wb") as dst_file:
-                        shutil.copyfileobj(src_file, dst_file)
-
-    copy_dir(skeleton_dir, publication_dir)
+    with contextlib.ExitStack() as stack:
+        bundled = template is None
+        if template is None:
+            # Get the bundled skeleton using importlib.resources
+            template = stack.enter_context(
+                importlib.resources.as_file(
+                    importlib.resources.files(templates).joinpath("skeleton")
+                )
+            )
+        stats = scaffold(
+            template,
+            publication_dir,
+            force,
+            env.workers,
+            hardlink=not bundled,
+        )
+    click.echo(stats.summary())
 
     click.echo(f"\n✅ Publication '{publication_name}' created successfully!")
     click.echo(f"\nNext steps:")
@@ -0,0 +1,436 @@
+"""
+Build daemon for GéraldMag.
+
+Keeps a pool of pre-initialised worker processes and accepts build jobs
+over a small JSON API, on a local TCP port or a Unix socket:
+
+- `POST /jobs`: submit a job (`publication`, optional `project`,
+  `priority` and `clean`)
+- `GET /jobs`: list the jobs
+- `GET /jobs/<id>`: status of a job
+- `DELETE /jobs/<id>`: cancel a queued job
+- `GET /jobs/<id>/report`: build report of a finished job
+- `GET /jobs/<id>/pdf`: PDF produced by a finished job
+"""
+
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+import nanoid
+
+from ..builder import Builder
+from ..preflight import PreflightError
+from ..workers import WorkerPool
+from .build import create_environment
+
+# Worker processes of the CPU-bound build steps, started by the first job of
+# a daemon worker and kept for its next jobs
+_pool: Optional[WorkerPool] = None
+
+
+def _warm_worker() -> None:
+    """
+    Pay the import and font initialisation cost once per worker process.
+
+    Fontconfig and Pango keep their font caches per process, the builds
+    of the worker reuse them.
+    """
+    import weasyprint
+
+    weasyprint.HTML(string="<p>GéraldMag</p>").render()
+
+
+def _stop(signum: int, frame: Any) -> None:
+    """
+    Turn SIGTERM into a clean shutdown of the daemon.
+    """
+    raise KeyboardInterrupt
+
+
+def _run_job(project: str, publication: str, clean: bool) -> Dict[str, Any]:
+    """
+    Build a publication inside a worker process.
+
+    Args:
+        project: Directory holding the mag.toml of the project
+        publication: Name of the publication to build
+        clean: If True, clean output directories before building
+
+    Returns:
+        Build report of the job
+    """
+    global _pool
+    os.chdir(project)
+    start = time.perf_counter()
+    env = create_environment(publication)
+    if _pool is None:
+        _pool = WorkerPool(env.workers)
+    builder = Builder(env=env, pool=_pool)
+    if clean:
+        builder.clean()
+    output = builder.build()
+    return {
+        "output": str(output),
+        "outputs": {
+            name: str(path) for name, path in builder.output_files.items()
+        },
+        "articles": [str(path) for path in builder.article_files],
+        "duration": time.perf_counter() - start,
+        "fetches": builder.fetcher.stats.summary(),
+    }
+
+
+def _job_error(error: Exception) -> str:
+    """
+    Describe the error of a failed job for the clients.
+
+    Args:
+        error: Exception raised by the build
+
+    Returns:
+        Error message, followed by the issues of failed pre-flight checks,
+        one per line, so that clients know which files are missing
+    """
+    lines = [f"{type(error).__name__}: {error}"]
+    if isinstance(error, PreflightError):
+        lines.extend(str(issue) for issue in error.issues)
+    return "\n".join(lines)
+
+
+@dataclass
+class Job:
+    """
+    A build job submitted to the daemon.
+    """
+
+    publication: str
+    project: str
+    priority: int = 0
+    clean: bool = False
+    id: str = field(default_factory=nanoid.generate)
+    status: str = "queued"
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    report: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class JobQueue:
+    """
+    Priority queue of build jobs dispatched to a pool of warm workers.
+
+    Jobs with a higher priority run first, jobs of equal priority run in
+    submission order. Only the most recent finished jobs are kept, with
+    their reports.
+    """
+
+    def __init__(self, workers: int, keep_finished: int = 100):
+        """
+        Initialize the queue and start the worker pool.
+
+        Args:
+            workers: Number of worker processes
+            keep_finished: Number of finished (done, failed or cancelled)
+                jobs kept; older ones are forgotten
+        """
+        self._jobs: Dict[str, Job] = {}
+        self._finished: collections.deque[str] = collections.deque()
+        self._keep_finished = keep_finished
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._queue: queue.PriorityQueue[Tuple[int, int, str]] = (
+            queue.PriorityQueue()
+        )
+        self._counter = itertools.count()
+        self._pool = self._new_pool()
+        # One dispatcher per worker, so that jobs wait in our queue (where
+        # they can be reordered and cancelled) rather than in the pool's
+        for _ in range(workers):
+            threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def submit(self, job: Job) -> Job:
+        """
+        Queue a job.
+
+        Args:
+            job: Job to queue
+
+        Returns:
+            The queued job
+        """
+        with self._lock:
+            self._jobs[job.id] = job
+        self._queue.put((-job.priority, next(self._counter), job.id))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Return a job by ID, or None if it is unknown.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        """
+        Return all the jobs known to the daemon.
+        """
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued job.
+
+        Args:
+            job_id: ID of the job to cancel
+
+        Returns:
+            True if the job was cancelled, False if it already started (or
+            was forgotten)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # Forgotten jobs were finished long ago
+            if job is None or job.status != "queued":
+                return False
+            self._finish(job, "cancelled")
+            return True
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker pool, dropping queued jobs.
+        """
+        with self._lock:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        """
+        Start a pool of warm workers.
+        """
+        return ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+
+    def _dispatch(self) -> None:
+        """
+        Feed queued jobs to the worker pool, one at a time.
+        """
+        while True:
+            _, _, job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                # Cancelled jobs may already be forgotten
+                if job is None or job.status != "queued":
+                    continue
+                job.status = "running"
+                job.started = time.time()
+                pool = self._pool
+            try:
+                report = pool.submit(
+                    _run_job, job.project, job.publication, job.clean
+                ).result()
+            except BrokenProcessPool as e:
+                # A worker died (crash, OOM kill...): the pool is unusable,
+                # the next jobs get a new one
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = self._new_pool()
+                        pool.shutdown(wait=False, cancel_futures=True)
+                    self._finish(job, "failed", error=f"Worker died: {e}")
+            except Exception as e:
+                with self._lock:
+                    self._finish(job, "failed", error=_job_error(e))
+            else:
+                with self._lock:
+                    self._finish(job, "done", report=report)
+
+    def _finish(
+        self,
+        job: Job,
+        status: str,
+        report: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """
+        Record the end of a job and forget the oldest finished jobs (to be
+        called with the lock held).
+
+        Args:
+            job: Finished job
+            status: Final status of the job
+            report: Build report, for a successful job
+            error: Error message, for a failed job
+        """
+        job.status = status
+        job.report = report
+        job.error = error
+        job.finished = time.time()
+        self._finished.append(job.id)
+        while len(self._finished) > self._keep_finished:
+            del self._jobs[self._finished.popleft()]
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler exposing a JobQueue.
+    """
+
+    jobs: JobQueue
+    project: str
+
+    def do_GET(self) -> None:
+        """Return the status, report or PDF of jobs."""
+        parts = self.path.strip("/").split("/")
+        if parts == ["jobs"]:
+            self._send_json(200, [asdict(job) for job in self.jobs.list()])
+            return
+        job = self._get_job(parts)
+        if job is None:
+            return
+        if len(parts) == 2:
+            self._send_json(200, asdict(job))
+        elif parts[2] == "report" and job.report is not None:
+            self._send_json(200, job.report)
+        elif parts[2] == "pdf" and job.report is not None:
+            try:
+                f = open(job.report["output"], "rb")
+            except FileNotFoundError:
+                self._send_json(404, {"error": f"PDF of job {job.id} is gone"})
+                return
+            # PDFs can weigh gigabytes, they are streamed
+            with f:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header(
+                    "Content-Length", str(os.fstat(f.fileno()).st_size)
+                )
+                self.end_headers()
+                shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+        else:
+            self._send_json(404, {"error": f"No {parts[2]} for job {job.id}"})
+
+    def do_POST(self) -> None:
+        """Submit a new job."""
+        if self.path.strip("/") != "jobs":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            job = Job(
+                publication=payload["publication"],
+                project=payload.get("project", self.project),
+                priority=int(payload.get("priority", 0)),
+                clean=bool(payload.get("clean", False)),
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"Invalid job: {e}"})
+            return
+        self._send_json(201, asdict(self.jobs.submit(job)))
+
+    def do_DELETE(self) -> None:
+        """Cancel a queued job."""
+        parts = self.path.strip("/").split("/")
+        job = self._get_job(parts)
+        if job is None:
+            return
+        if self.jobs.cancel(job.id):
+            self._send_json(200, asdict(job))
+        else:
+            self._send_json(409, {"error": f"Job {job.id} is {job.status}"})
+
+    def address_string(self) -> str:
+        """Unix sockets have no client address."""
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return "unix"
+
+    def _get_job(self, parts: List[str]) -> Optional[Job]:
+        """Find the job addressed by a path, answering 404 if unknown."""
+        job = None
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+        if job is None:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+        return job
+
+    def _send_json(self, status: int, data: Any) -> None:
+        """Send a JSON response."""
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """
+    HTTP server listening on a Unix socket.
+    """
+
+    daemon_threads = True
+
+
+def serve_daemon(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    socket_path: str | None = None,
+    workers: int = 2,
+    keep_jobs: int = 100,
+):
+    """
+    Run the build daemon until interrupted.
+
+    Args:
+        host: Address to listen on
+        port: Port to listen on
+        socket_path: If set, listen on this Unix socket instead
+        workers: Number of warm worker processes
+        keep_jobs: Number of finished jobs kept, with their reports
+    """
+    jobs = JobQueue(workers, keep_jobs)
+
+    class Handler(JobRequestHandler):
+        pass
+
+    Handler.jobs = jobs
+    Handler.project = str(Path.cwd())
+
+    if socket_path is not None:
+        Path(socket_path).unlink(missing_ok=True)
+        server = UnixHTTPServer(socket_path, Handler)
+        click.echo(f"GéraldMag daemon listening on {socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), Handler)
+        click.echo(f"GéraldMag daemon listening on http://{host}:{port}")
+
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        click.echo("\nStopping GéraldMag daemon...")
+    finally:
+        server.server_close()
+        jobs.shutdown()
+        if socket_path is not None:
+            Path(socket_path).unlink(missing_ok=True)
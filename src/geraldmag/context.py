@@ -3,12 +3,17 @@ Context classes for GéraldMag.
 """
 
 from dataclasses import dataclass, field
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 import nanoid
 
+from .articles import Article
 from .assets import FontBucket, ImageBucket, StyleCompiler
+from .cache import ArtifactCache
 from .env import PublicationEnvironment
+from .hyphenation import Hyphenator
+from .spool import Spool
+from .workers import WorkerPool
 
 
 @dataclass
@@ -26,6 +31,32 @@ class Context:
     styles: StyleCompiler = field(default_factory=StyleCompiler)
     images: ImageBucket = field(default_factory=ImageBucket)
     fonts: FontBucket = field(default_factory=FontBucket)
+    cache: ArtifactCache = field(init=False)
+    articles: List[Article] = field(default_factory=list)
+    hyphenator: Optional[Hyphenator] = field(init=False)
+    spool: Optional[Spool] = field(init=False)
+    pool: WorkerPool = field(default_factory=WorkerPool)
+
+    def __post_init__(self):
+        self.cache = ArtifactCache.create(self.env)
+        self.styles.cache = self.cache
+        self.styles.images = self.images
+        self.styles.fonts = self.fonts
+        self.hyphenator = None
+        if self.env.hyphenation:
+            self.hyphenator = Hyphenator(
+                self.env.hyphenation,
+                self.env.hyphenation_min_length,
+                self.cache,
+            )
+        self.spool = None
+        if self.env.low_memory:
+            self.spool = Spool(
+                self.env.build_dir.absolute
+                / self.publication
+                / "fragments.spool",
+                self.env.spill_threshold * 2**20,
+            )
 
 
 class PageContext(Context):
@@ -45,6 +76,11 @@ class PageContext(Context):
         self.styles = parent_context.styles
         self.images = parent_context.images
         self.fonts = parent_context.fonts
+        self.cache = parent_context.cache
+        self.articles = parent_context.articles
+        self.hyphenator = parent_context.hyphenator
+        self.spool = parent_context.spool
+        self.pool = parent_context.pool
         self.scope = nanoid.generate()
         self.page: Dict[str, Any] = {}
         self.content: str = ""
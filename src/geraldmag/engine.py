@@ -2,22 +2,36 @@
 Template engine for GéraldMag.
 """
 
+import time
 from pathlib import Path
-from typing import Optional, Type, cast
+from typing import Dict, Iterator, Optional, Tuple, Type, cast
 
 import jinja2
 from jinja2 import Environment, nodes
 from jinja2.ext import Extension
 from jinja2.parser import Parser
 
+from .articles import Article, mark_article
 from .context import Context, PageContext
 from .processors import ProcessorFactory
+from .processors.types import PProcessor
+
+# Key of the per-build memos: resolved path, processor and top-level flag
+MemoKey = Tuple[Path, Type[PProcessor], bool]
 
 
 class ContentExtension(Extension):
     """
     Jinja2 extension that adds a {% content 'path/to/file.md' %} tag
     which processes and includes content files (md, html).
+
+    Processors only depend on the file they process, so a file included
+    several times is processed once per build: later includes reuse its
+    fragment and its scope. With {% content 'path/to/file.md' cache %},
+    a top-level include reuses the whole fragment of the first one, and is
+    not counted again as an article. In low-memory mode, fragments are not
+    kept: a file included several times is processed again, with the same
+    scope.
     """
 
     tags = {"content"}
@@ -26,6 +40,14 @@ class ContentExtension(Extension):
         super().__init__(environment)
         self.context: Optional[Context] = None
         self.processor_factory: Optional[ProcessorFactory] = None
+        # Nesting level of the content being rendered, 0 at the top level
+        self._depth = 0
+        # Per-build memos, by resolved path, processor and nesting (top-level
+        # fragments are hyphenated). Only the scope and title of an include
+        # are kept, not its page context, which holds its whole content
+        self._pages: Dict[MemoKey, Tuple[str, Optional[str]]] = {}
+        self._fragments: Dict[MemoKey, str] = {}
+        self._shared: Dict[MemoKey, str] = {}
 
     def set_context(
         self, context: Context, processor_factory: ProcessorFactory
@@ -40,19 +62,45 @@ class ContentExtension(Extension):
 
         # Parse the file path argument
         file_path = parser.parse_expression()
+        cache = parser.stream.skip_if("name:cache")
 
         # Create a call to _render_content with the file path
-        call = self.call_method("_render_content", [file_path], lineno=lineno)
+        call = self.call_method(
+            "_render_content",
+            [file_path, nodes.Const(cache)],
+            lineno=lineno,
+        )
 
         # Return the output node that will render the content
         return nodes.Output([nodes.MarkSafe(call)]).set_lineno(lineno)
 
-    def _render_content(self, file_path: str) -> str:
+    def resolve_path(self, file_path: str) -> Path:
+        """
+        Resolve the path given to a content tag.
+
+        Args:
+            file_path: Path to the content file, relative to content_dir
+
+        Returns:
+            Absolute path to the content file
+        """
+        if not self.context:
+            raise RuntimeError("ContentExtension not initialized with context")
+
+        # Convert to absolute path
+        content_dir = self.context.env.content_dir.absolute
+        if Path(file_path).is_absolute():
+            return Path(file_path)
+        return content_dir / file_path
+
+    def _render_content(self, file_path: str, cache: bool = False) -> str:
         """
         Process and render a content file.
 
         Args:
             file_path: Path to the content file
+            cache: If True, reuse the whole fragment of a previous include
+                of the file
 
         Returns:
             Processed content
@@ -62,20 +110,76 @@ class ContentExtension(Extension):
                 "ContentExtension not properly initialized with context and processor factory"
             )
 
-        # Convert to absolute path
-        content_dir = self.context.env.content_dir.absolute
-        if Path(file_path).is_absolute():
-            abs_path = Path(file_path)
-        else:
-            abs_path = content_dir / file_path
-
-        page_context = PageContext(self.context)
+        abs_path = self.resolve_path(file_path)
 
         # Get the appropriate processor
         processor_cls = self.processor_factory.get_processor(abs_path)
 
-        # Process the content and return it as a string
-        return processor_cls().process(abs_path, page_context)
+        top_level = self._depth == 0
+        key = (abs_path.resolve(), processor_cls, top_level)
+        if cache and key in self._shared:
+            return self._shared[key]
+
+        # Process the content, unless it already was
+        start = time.perf_counter()
+        memo = self._pages.get(key)
+        html = self._fragments.get(key)
+        if html is None or memo is None:
+            page_context = PageContext(self.context)
+            if memo is not None:
+                # Same scope, so that its styles are not registered again
+                page_context.scope = memo[0]
+            self._depth += 1
+            try:
+                html = processor_cls().process(abs_path, page_context)
+            finally:
+                self._depth -= 1
+            memo = (page_context.scope, page_context.page.get("title"))
+            self._pages[key] = memo
+
+            # Nested includes are hyphenated along with their parent
+            if top_level and self.context.hyphenator is not None:
+                html = self.context.hyphenator.hyphenate(html)
+            # In low-memory mode, fragments are not kept in memory
+            if self.context.spool is None:
+                self._fragments[key] = html
+        render_time = time.perf_counter() - start
+
+        if not top_level:
+            # Nested fragments cannot be spooled, low-memory mode does not
+            # keep them
+            if cache and self.context.spool is None:
+                self._shared[key] = html
+            return html
+
+        # Top-level includes are the articles of the publication
+        fragment, anchor = mark_article(html, len(self.context.articles))
+        if anchor is not None:
+            self.context.articles.append(
+                Article(abs_path, anchor, memo[1], render_time)
+            )
+
+        marked = fragment is not html
+        fragment = self._spill(fragment)
+        if cache:
+            # Later includes are not articles, they go without the anchor
+            self._shared[key] = self._spill(html) if marked else fragment
+        return fragment
+
+    def _spill(self, html: str) -> str:
+        """
+        Spool a top-level fragment to disk, in low-memory mode.
+
+        Args:
+            html: Processed fragment
+
+        Returns:
+            Placeholder of the fragment, or the fragment itself
+        """
+        if self.context is None or self.context.spool is None:
+            return html
+        # The fragment waits on disk for the final HTML
+        return self.context.spool.spill(html)
 
 
 class Engine:
@@ -122,13 +226,33 @@ class Engine:
         Returns:
             Processed template content
         """
+        # Render the template with the context
+        return self._get_template(template_path).render(context=self.context)
+
+    def generate(self, template_path: Path) -> Iterator[str]:
+        """
+        Process a template file, piece by piece.
+
+        Args:
+            template_path: Path to the template file
+
+        Yields:
+            Pieces of the processed template content
+        """
+        return self._get_template(template_path).generate(context=self.context)
+
+    def _get_template(self, template_path: Path) -> jinja2.Template:
+        """
+        Load a template file.
+
+        Args:
+            template_path: Path to the template file
+
+        Returns:
+            Loaded template
+        """
         # Convert absolute path to relative path based on content_dir
         rel_path = template_path.relative_to(
             self.context.env.content_dir.absolute
         )
-
-        # Get the template
-        template = self.env.get_template(str(rel_path))
-
-        # Render the template with the context
-        return template.render(context=self.context)
+        return self.env.get_template(str(rel_path))
@@ -5,7 +5,8 @@ Configuration environment for GéraldMag.
 import functools
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Self, get_origin, get_type_hints
+from typing import Any, Dict, List, Self, get_origin, get_type_hints
+from urllib.parse import urlparse
 
 import toml
 
@@ -38,6 +39,13 @@ class EnvPath:
         return self.value
 
 
+def _is_relative_path(value: str) -> bool:
+    """Tell whether a location (path or URL) is a relative path."""
+    if not value or Path(value).is_absolute():
+        return False
+    return not urlparse(value).scheme
+
+
 @dataclass(kw_only=True)
 class Environment:
     """
@@ -66,6 +74,21 @@ class Environment:
 
     entrypoint: str = "index.html"
     verbose: bool = False
+    offline: bool = False
+    artifact_cache: str = ""
+    workers: int = 0
+    memory_budget: int = 0
+    low_memory: bool = False
+    spill_threshold: int = 0
+    markdown_split_size: int = 256 * 1024
+    data_chunk_rows: int = 500
+    preflight: bool = True
+    split_articles: bool = False
+    report: bool = False
+    hyphenation: str = ""
+    hyphenation_min_length: int = 6
+    output_profiles: List[str] = field(default_factory=list)
+    profiles: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     publication_config: str = "pub.toml"
 
     def load(self, config_dict: Dict[str, Any], config_path: Path) -> None:
@@ -87,6 +110,10 @@ class Environment:
                     setattr(
                         self, key, EnvPath(value=value, setfrom=config_path)
                     )
+                elif key == "artifact_cache" and _is_relative_path(value):
+                    # A shared cache directory is relative to the file
+                    # configuring it, like the other paths
+                    setattr(self, key, str(config_path / value))
                 else:
                     # For non-path types, just set the value directly
                     setattr(self, key, value)
@@ -183,3 +210,22 @@ class PublicationEnvironment(Environment):
             except Exception as e:
                 print(f"Warning: Error loading configuration file: {e}")
         return env
+
+    def main_styles(self) -> List[Path]:
+        """
+        Return the entry point styles of the publication: `main.scss`, else
+        `main.css`, in the default styles then in the publication styles.
+
+        Returns:
+            Paths to the styles, in the order they apply
+        """
+        styles: List[Path] = []
+        for styles_dir in (
+            self.default_dir.absolute / "styles",
+            self.publication_root.absolute / "styles",
+        ):
+            for name in ("main.scss", "main.css"):
+                if (styles_dir / name).exists():
+                    styles.append(styles_dir / name)
+                    break
+        return styles
@@ -0,0 +1,281 @@
+"""
+URL fetcher serving WeasyPrint from the build's asset buckets.
+"""
+
+import hashlib
+import json
+import mimetypes
+import mmap
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from .context import Context
+from .fsutil import FileLock, atomic_write
+
+
+@dataclass
+class FetchStats:
+    """
+    Counters and timings of the resources fetched during a PDF render.
+    """
+
+    counts: Dict[str, int] = field(default_factory=dict)
+    durations: Dict[str, float] = field(default_factory=dict)
+    urls: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, kind: str, url: str, elapsed: float) -> None:
+        """
+        Record a fetch.
+
+        Args:
+            kind: Where the resource was served from
+            url: URL requested by WeasyPrint
+            elapsed: Time spent serving the request, in seconds
+        """
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self.durations[kind] = self.durations.get(kind, 0.0) + elapsed
+        self.urls[url] = self.urls.get(url, 0) + 1
+
+    def summary(self) -> List[str]:
+        """
+        Return a human readable summary of the fetches.
+
+        Returns:
+            One line per source kind, plus the most requested URLs
+        """
+        lines = [
+            f"{kind}: {count} fetch(es) in {self.durations[kind] * 1000:.1f} ms"
+            for kind, count in sorted(self.counts.items())
+        ]
+        repeated = sorted(
+            ((count, url) for url, count in self.urls.items() if count > 1),
+            reverse=True,
+        )
+        for count, url in repeated[:10]:
+            lines.append(f"  {count}x {url}")
+        return lines
+
+
+class RemoteCache:
+    """
+    On-disk cache of remote images, revalidated with HTTP validators
+    (ETag / Last-Modified).
+    """
+
+    def __init__(self, cache_dir: Path, offline: bool = False):
+        """
+        Initialize the remote cache.
+
+        Args:
+            cache_dir: Directory where remote resources are stored
+            offline: If True, never access the network
+        """
+        self.cache_dir = cache_dir
+        self.offline = offline
+
+    def fetch(self, url: str, timeout: int = 10) -> Tuple[Path, str, bool]:
+        """
+        Fetch a remote image, from the cache when it is still valid.
+
+        Args:
+            url: HTTP(S) URL of the image
+            timeout: Network timeout in seconds
+
+        Returns:
+            Tuple of the cached file, its MIME type and whether the network
+            was hit for a new body
+
+        Raises:
+            ValueError: If the resource is not an image, or if it is not
+                cached while running offline
+        """
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        # Concurrent builds revalidate a given URL one at a time, so that
+        # only the first one downloads it
+        with FileLock(self.cache_dir / f"{key}.lock", shared=self.offline):
+            return self._fetch(url, key, timeout)
+
+    def _fetch(
+        self, url: str, key: str, timeout: int
+    ) -> Tuple[Path, str, bool]:
+        """
+        Fetch a remote image while holding the lock of its cache entry.
+
+        Args:
+            url: HTTP(S) URL of the image
+            key: Key of the cache entry
+            timeout: Network timeout in seconds
+
+        Returns:
+            Tuple of the cached file, its MIME type and whether the network
+            was hit for a new body
+        """
+        body_path = self.cache_dir / f"{key}.body"
+        meta_path = self.cache_dir / f"{key}.json"
+        meta: Dict[str, Any] = {}
+        if meta_path.exists() and body_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+
+        if self.offline:
+            if not meta:
+                raise ValueError(f"Offline build, {url} is not cached")
+            return body_path, meta["mime_type"], False
+
+        headers: Dict[str, str] = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                mime_type = response.headers.get_content_type()
+                if not mime_type.startswith("image/"):
+                    raise ValueError(
+                        f"Refusing remote resource of type {mime_type}: {url}"
+                    )
+                body = response.read()
+                meta = {
+                    "url": url,
+                    "mime_type": mime_type,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and meta:
+                return body_path, meta["mime_type"], False
+            raise
+        except urllib.error.URLError:
+            # Keep building with a stale copy rather than failing
+            if meta:
+                return body_path, meta["mime_type"], False
+            raise
+
+        atomic_write(body_path, body)
+        atomic_write(meta_path, json.dumps(meta))
+        return body_path, mime_type, True
+
+
+class AssetFetcher:
+    """
+    WeasyPrint URL fetcher answering from the build's in-memory buckets.
+
+    Compiled styles are served from `StyleCompiler.css`, images and fonts
+    from the source files registered in `ImageBucket` and `FontBucket`
+    (memory-mapped, without going through the copies in the build
+    directory). Remote images are cached on disk, any other network access
+    is refused.
+    """
+
+    def __init__(self, context: Context, build_path: Path):
+        """
+        Initialize the fetcher.
+
+        Args:
+            context: Context of the build
+            build_path: Directory holding the consolidated HTML
+        """
+        self.context = context
+        self.build_path = build_path
+        self.remote = RemoteCache(
+            context.env.build_dir.absolute / ".remote",
+            offline=context.env.offline,
+        )
+        self.stats = FetchStats()
+
+    def __call__(
+        self, url: str, timeout: int = 10, ssl_context: Any = None
+    ) -> Dict[str, Any]:
+        """
+        Fetch a resource for WeasyPrint.
+
+        Args:
+            url: URL of the resource
+            timeout: Network timeout in seconds
+            ssl_context: Unused, remote resources go through the cache
+
+        Returns:
+            A WeasyPrint URL fetcher result
+
+        Raises:
+            ValueError: If the URL would require an unexpected network access
+        """
+        start = time.perf_counter()
+        scheme = urlparse(url).scheme
+        if scheme == "file":
+            kind, result = self._fetch_file(url)
+        elif scheme in ("http", "https"):
+            path, mime_type, downloaded = self.remote.fetch(url, timeout)
+            kind = "remote" if downloaded else "remote-cached"
+            result = self._map_file(path, mime_type)
+        elif scheme == "data":
+            # Only called by WeasyPrint, which is loaded by then
+            import weasyprint
+
+            kind = "data"
+            result = weasyprint.default_url_fetcher(url, timeout)
+        else:
+            raise ValueError(f"Refusing to fetch {url}")
+        result["redirected_url"] = url
+        self.stats.record(kind, url, time.perf_counter() - start)
+        return result
+
+    def _fetch_file(self, url: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        Serve a local file, from the buckets when it is a build asset.
+
+        Args:
+            url: file:// URL of the resource
+
+        Returns:
+            Tuple of the source kind and the fetcher result
+        """
+        path = Path(urllib.request.url2pathname(urlparse(url).path))
+        folder = path.parent
+        if folder == self.build_path / "styles" and path.name == "main.css":
+            if self.context.styles.css is not None:
+                return "style", {
+                    "string": self.context.styles.css.encode("utf-8"),
+                    "mime_type": "text/css",
+                    "encoding": "utf-8",
+                }
+        if folder == self.build_path / "images":
+            source = self.context.images.lookup(path.name)
+            if source is not None:
+                return "image", self._map_file(source)
+        if folder == self.build_path / "fonts":
+            source = self.context.fonts.lookup(path.name)
+            if source is not None:
+                return "font", self._map_file(source)
+        return "file", self._map_file(path)
+
+    def _map_file(
+        self, path: Path, mime_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Memory-map a file into a fetcher result.
+
+        Args:
+            path: Path to the file
+            mime_type: MIME type, guessed from the file name if None
+
+        Returns:
+            A WeasyPrint URL fetcher result
+        """
+        if mime_type is None:
+            mime_type = mimetypes.guess_type(path.name)[0]
+        with path.open("rb") as f:
+            if path.stat().st_size == 0:
+                return {"string": b"", "mime_type": mime_type}
+            # WeasyPrint closes the file object once it has been read
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return {
+            "file_obj": mapped,
+            "mime_type": mime_type,
+            "filename": path.name,
+        }
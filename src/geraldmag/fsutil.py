@@ -0,0 +1,195 @@
+"""
+File system helpers for GéraldMag: atomic writes, file clones and file
+locks.
+
+Every artifact of a build is written to a temporary file in its target
+directory, then renamed over the target. Readers, including other builds
+running at the same time, see either the old or the new file, never a
+partial one, and do not need any lock.
+"""
+
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+# ioctl cloning a file (reflink) on Linux: Btrfs, XFS, OCFS2, NFS 4.2...
+FICLONE = 0x40049409
+
+
+def _read_umask() -> int:
+    """
+    Read the umask of the process without changing it.
+
+    `os.umask` can only read the mask by setting it, which would race the
+    files other threads create in the meantime. Linux exposes the mask in
+    /proc; elsewhere, the mode of a new directory tells it.
+
+    Returns:
+        Umask of the process
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    # Directories, unlike files, get the execute bits of the mask too
+    parent = tempfile.mkdtemp()
+    try:
+        probe = os.path.join(parent, "probe")
+        os.mkdir(probe, 0o777)
+        return 0o777 & ~os.stat(probe).st_mode
+    finally:
+        shutil.rmtree(parent, ignore_errors=True)
+
+
+# Temporary files are created private (0600), artifacts get the usual mode
+_UMASK = _read_umask()
+
+
+@contextlib.contextmanager
+def atomic_open(path: Path) -> Iterator[IO[bytes]]:
+    """
+    Open a file for writing, replacing the target only once it is complete.
+
+    Args:
+        path: Path of the file to write
+
+    Yields:
+        Binary file object to write to
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def atomic_write(path: Path, data: bytes | str) -> None:
+    """
+    Write a file atomically.
+
+    Args:
+        path: Path of the file to write
+        data: Content of the file, str is encoded as UTF-8
+    """
+    with atomic_open(path) as f:
+        f.write(data.encode("utf-8") if isinstance(data, str) else data)
+
+
+def atomic_copy(src: Path, dst: Path) -> None:
+    """
+    Copy a file atomically, preserving its metadata.
+
+    Args:
+        src: Path of the file to copy
+        dst: Path of the copy
+    """
+    with atomic_open(dst) as f:
+        with src.open("rb") as s:
+            shutil.copyfileobj(s, f)
+    shutil.copystat(src, dst)
+
+
+def clone_file(src: Path, dst: Path, hardlink: bool = False) -> str:
+    """
+    Copy a file as cheaply as the file system allows, atomically.
+
+    The copy is a reflink (a copy-on-write clone, sharing the blocks of the
+    source) where the file system supports it, else a hard link if
+    allowed, else a plain copy preserving the metadata of the source.
+
+    Args:
+        src: Path of the file to copy
+        dst: Path of the copy
+        hardlink: If True, a hard link may be used; the copy then is the
+            source, and editing it in place edits the source too
+
+    Returns:
+        How the file was copied: "reflink", "hardlink" or "copy"
+    """
+    if fcntl is not None and sys.platform.startswith("linux"):
+        try:
+            with atomic_open(dst) as f, src.open("rb") as s:
+                fcntl.ioctl(f.fileno(), FICLONE, s.fileno())
+            shutil.copystat(src, dst)
+            return "reflink"
+        except OSError:
+            pass
+
+    if hardlink:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=f".{dst.name}.")
+        os.close(fd)
+        os.unlink(tmp)
+        try:
+            os.link(src, tmp)
+            os.replace(tmp, dst)
+            return "hardlink"
+        except OSError:
+            # Another file system, or one without hard links
+            Path(tmp).unlink(missing_ok=True)
+
+    atomic_copy(src, dst)
+    return "copy"
+
+
+class FileLock:
+    """
+    Advisory lock held on a lock file, shared between processes.
+
+    Locks are per resource (one per publication, one per cache entry...),
+    so builds of different publications never wait for each other.
+    """
+
+    def __init__(self, path: Path, shared: bool = False):
+        """
+        Initialize the lock.
+
+        Args:
+            path: Path of the lock file, created if needed
+            shared: If True, take a shared (reader) lock instead of an
+                exclusive one (only exclusive locks exist on Windows)
+        """
+        self.path = path
+        self.shared = shared
+        self._file: Optional[IO[bytes]] = None
+
+    def __enter__(self) -> "FileLock":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a+b")
+        if fcntl is not None:
+            fcntl.flock(
+                self._file.fileno(),
+                fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX,
+            )
+        else:  # pragma: no cover - Windows
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        assert self._file is not None
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:  # pragma: no cover - Windows
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
@@ -0,0 +1,133 @@
+"""
+Hyphenation pre-pass for GéraldMag.
+
+Inserts soft hyphens in the text of the paragraphs produced by the
+processors, so that WeasyPrint (with `hyphens: manual`) does not need to
+look every word up in its dictionaries while laying the pages out.
+Results are kept in the artifact cache, keyed by the text of the
+paragraphs, so unchanged content is not hyphenated again.
+"""
+
+import json
+import re
+from typing import Dict, List, Optional
+
+import pyphen
+
+from .cache import PArtifactCache, artifact_key
+
+SOFT_HYPHEN = "\u00ad"
+
+# Comments and tags of an HTML fragment, the text is between them
+TAG_RE = re.compile(r"(<!--.*?-->|<[^>]*>)", re.DOTALL)
+TAG_NAME_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)")
+# Character references are kept as they are, words are hyphenated
+WORD_RE = re.compile(r"&#?\w+;|[^\W\d_]+")
+
+# Elements whose text is not hyphenated, even inside a paragraph
+SKIPPED_TAGS = {"code", "kbd", "pre", "samp", "script", "style", "var"}
+
+
+class Hyphenator:
+    """
+    Inserts soft hyphens in the paragraphs of HTML fragments.
+    """
+
+    def __init__(
+        self,
+        lang: str,
+        min_length: int = 6,
+        cache: Optional[PArtifactCache] = None,
+    ):
+        """
+        Initialize the hyphenator.
+
+        Args:
+            lang: Language of the dictionary (e.g. "fr_FR" or "en-GB")
+            min_length: Length under which words are not hyphenated
+            cache: Artifact cache for the hyphenated fragments
+
+        Raises:
+            ValueError: If no dictionary is available for the language
+        """
+        dictionary = pyphen.language_fallback(lang)
+        if dictionary is None:
+            raise ValueError(f"No hyphenation dictionary for: {lang}")
+        self.lang = dictionary
+        self.min_length = min_length
+        self.cache = cache
+        self._pyphen = pyphen.Pyphen(lang=dictionary)
+        # Words repeat a lot, each is only looked up once per build
+        self._words: Dict[str, str] = {}
+
+    def hyphenate(self, html: str) -> str:
+        """
+        Insert soft hyphens in the paragraphs of an HTML fragment.
+
+        The cache is keyed by the text of the paragraphs alone: tags and
+        their attributes (scopes, image URLs, anchors...) change with every
+        build, the text does not.
+
+        Args:
+            html: HTML fragment
+
+        Returns:
+            HTML fragment with soft hyphens in the text of its paragraphs
+        """
+        parts = TAG_RE.split(html)
+        # Indexes of the text parts to hyphenate
+        slots: List[int] = []
+        paragraphs = 0
+        skipped = 0
+        # Odd parts are tags, even parts are text
+        for index, part in enumerate(parts):
+            if index % 2:
+                match = TAG_NAME_RE.match(part)
+                if match is None or part.endswith("/>"):
+                    continue
+                step = -1 if match[1] else 1
+                name = match[2].lower()
+                if name == "p":
+                    paragraphs = max(0, paragraphs + step)
+                elif name in SKIPPED_TAGS:
+                    skipped = max(0, skipped + step)
+            elif paragraphs and not skipped and part:
+                slots.append(index)
+        if not slots:
+            return html
+
+        texts = [parts[index] for index in slots]
+        key = None
+        hyphenated: Optional[List[str]] = None
+        if self.cache is not None:
+            key = artifact_key(
+                "hyphenation",
+                pyphen.__version__,
+                self.lang,
+                str(self.min_length),
+                *texts,
+            )
+            cached = self.cache.get(key)
+            if cached is not None:
+                hyphenated = json.loads(cached)
+        if hyphenated is None or len(hyphenated) != len(texts):
+            hyphenated = [
+                WORD_RE.sub(self._hyphenate_word, text) for text in texts
+            ]
+            if self.cache is not None and key is not None:
+                self.cache.put(key, json.dumps(hyphenated).encode("utf-8"))
+
+        for index, text in zip(slots, hyphenated):
+            parts[index] = text
+        return "".join(parts)
+
+    def _hyphenate_word(self, match: re.Match[str]) -> str:
+        """Hyphenate a word matched by WORD_RE."""
+        word = match[0]
+        if len(word) < self.min_length or word.startswith("&"):
+            return word
+        hyphenated = self._words.get(word)
+        if hyphenated is None:
+            hyphenated = self._pyphen.inserted(word, hyphen=SOFT_HYPHEN)
+            self._words[word] = hyphenated
+        return hyphenated
@@ -1,8 +1,12 @@
+from pathlib import Path
+
 import click
 
 from .commands.build import build_process
+from .commands.check import check_publication
 from .commands.init import init_project
 from .commands.new import create_publication
+from .commands.serve import serve_daemon
 
 
 @click.group()
@@ -14,17 +18,27 @@ def cli():
 
 @cli.command("init")
 @click.option("--force", is_flag=True, help="Overwrite existing files")
-def init(force: bool):
+@click.option(
+    "--template",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    help="Template directory to scaffold the project from",
+)
+def init(force: bool, template: Path | None):
     """Initialize a new GéraldMag project."""
-    init_project(force)
+    init_project(force, template)
 
 
 @cli.command("new")
 @click.argument("publication_name")
 @click.option("--force", is_flag=True, help="Overwrite existing publication")
-def new(publication_name: str, force: bool):
+@click.option(
+    "--template",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    help="Template directory to scaffold the publication from",
+)
+def new(publication_name: str, force: bool, template: Path | None):
     """Create a new publication."""
-    create_publication(publication_name, force)
+    create_publication(publication_name, force, template)
 
 
 @cli.command("build")
@@ -38,11 +52,30 @@ def new(publication_name: str, force: bool):
     type=click.Path(exists=False, file_okay=False, path_type=str),
     help="Custom output path for the PDF",
 )
+@click.option(
+    "--split-articles",
+    is_flag=True,
+    help="Also write each top-level content include as its own PDF",
+)
+@click.option(
+    "--profile",
+    "profiles",
+    multiple=True,
+    help="Output profile to write (print, web, proof...), repeatable",
+)
+@click.option(
+    "--report",
+    is_flag=True,
+    help="Also write a JSON and HTML report of the PDF size and build time",
+)
 def build(
     publication_name: str,
     clean: bool = False,
     output_path: str | None = None,
     verbose: bool = False,
+    split_articles: bool = False,
+    profiles: tuple[str, ...] = (),
+    report: bool = False,
 ):
     """Initialize a new GéraldMag project."""
     build_process(
@@ -50,6 +83,45 @@ def build(
         clean=clean,
         output_path=output_path,
         verbose=verbose,
+        split_articles=split_articles,
+        profiles=profiles,
+        report=report,
+    )
+
+
+@cli.command("check")
+@click.argument("publication_name")
+def check(publication_name: str):
+    """Check a publication for missing files without building it."""
+    if not check_publication(publication_name):
+        raise SystemExit(1)
+
+
+@cli.command("serve")
+@click.option("--host", default="127.0.0.1", help="Address to listen on")
+@click.option("--port", default=8765, help="Port to listen on")
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False, path_type=str),
+    help="Listen on a Unix socket instead of a TCP port",
+)
+@click.option("--workers", default=2, help="Number of warm worker processes")
+@click.option("--keep-jobs", default=100, help="Number of finished jobs kept")
+def serve(
+    host: str,
+    port: int,
+    socket_path: str | None,
+    workers: int,
+    keep_jobs: int,
+):
+    """Run a build daemon with warm workers."""
+    serve_daemon(
+        host=host,
+        port=port,
+        socket_path=socket_path,
+        workers=workers,
+        keep_jobs=keep_jobs,
     )
 
 
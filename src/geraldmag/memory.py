@@ -0,0 +1,52 @@
+"""
+Memory usage of the build process.
+"""
+
+import os
+import sys
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+# ru_maxrss is in kilobytes on Linux, in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def current_rss() -> Optional[int]:
+    """
+    Return the resident set size of the process.
+
+    Returns:
+        RSS in bytes, the peak RSS where the current one is not available,
+        None if neither is
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss(children: bool = False) -> Optional[int]:
+    """
+    Return the peak resident set size of the process.
+
+    The peak is over the whole lifetime of the process: in a long-running
+    process (a worker of the build daemon), it is that of the largest job
+    so far, not of the current one.
+
+    Args:
+        children: If True, return the largest peak of the terminated
+            worker processes instead (any that ever terminated)
+
+    Returns:
+        Peak RSS in bytes, None if not available
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return resource.getrusage(who).ru_maxrss * _MAXRSS_UNIT
@@ -0,0 +1,291 @@
+"""
+Pre-flight validation of a publication.
+
+Checks, in seconds and before the expensive PDF stage, that everything a
+build refers to exists: templates, `{% content %}` targets, frontmatter,
+styles, images and fonts.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, cast
+
+import frontmatter  # type: ignore
+import jinja2
+from jinja2 import meta, nodes
+
+from .assets import CSS_URL_RE, IMG_SRC_RE, local_asset
+from .engine import ContentExtension, Engine
+from .processors.data import DataProcessor
+
+# Expected types of the frontmatter fields used by GéraldMag
+FRONTMATTER_SCHEMA: Dict[str, type] = {
+    "title": str,
+    "style": str,
+    "template": str,
+}
+
+# Images of the Markdown syntax; HTML images and style resources are found
+# with the expressions of the build
+MD_IMAGE_RE = re.compile(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)")
+
+# Unquoted url() arguments of SCSS that are Sass expressions (variables,
+# function calls, operations), only known once compiled
+SASS_EXPRESSION_RE = re.compile(r"[$(+*'\"]|#\{")
+
+
+@dataclass
+class Issue:
+    """
+    A problem found by the pre-flight checks.
+    """
+
+    path: Path
+    message: str
+    lineno: Optional[int] = None
+
+    def __str__(self) -> str:
+        location = str(self.path)
+        if self.lineno is not None:
+            location += f":{self.lineno}"
+        return f"{location}: {self.message}"
+
+
+class PreflightError(Exception):
+    """
+    Raised when the pre-flight checks of a build fail.
+    """
+
+    def __init__(self, issues: List[Issue]):
+        self.issues = issues
+        super().__init__(
+            f"Pre-flight checks failed with {len(issues)} issue(s)"
+        )
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Rebuilt from its issues, not its message, when it comes back from
+        # a worker process of the daemon
+        return type(self), (self.issues,)
+
+
+class Preflight:
+    """
+    Validates a publication without rendering it.
+    """
+
+    def __init__(self, engine: Engine):
+        """
+        Initialize the pre-flight checks.
+
+        Args:
+            engine: Template engine of the build
+        """
+        self.engine = engine
+        self.env = engine.context.env
+        self.extension = cast(
+            ContentExtension,
+            engine.env.extensions[ContentExtension.identifier],
+        )
+
+    def run(self) -> List[Issue]:
+        """
+        Run all the checks.
+
+        Returns:
+            Issues found, empty if the publication looks buildable
+        """
+        entrypoint = self.env.publication_root.absolute / self.env.entrypoint
+        if not entrypoint.exists():
+            return [Issue(entrypoint, "Entry point not found")]
+
+        issues: List[Issue] = []
+        contents: List[Tuple[Path, Path, int]] = []
+        self._walk_template(entrypoint, contents, issues, set())
+
+        styles = self.env.main_styles()
+        with ThreadPoolExecutor(max_workers=self.env.workers or None) as pool:
+            for found, more_styles in pool.map(
+                lambda item: self._check_content(*item), contents
+            ):
+                issues.extend(found)
+                styles.extend(more_styles)
+            for found in pool.map(self._check_style, set(styles)):
+                issues.extend(found)
+        return issues
+
+    def _walk_template(
+        self,
+        path: Path,
+        contents: List[Tuple[Path, Path, int]],
+        issues: List[Issue],
+        seen: Set[Path],
+    ) -> None:
+        """
+        Parse a template, collecting its content tags and following the
+        templates it includes, extends or imports.
+
+        Args:
+            path: Path to the template
+            contents: Collected (content file, template, line) triples
+            issues: Collected issues
+            seen: Templates already walked
+        """
+        if path in seen:
+            return
+        seen.add(path)
+        source = path.read_text(encoding="utf-8")
+        try:
+            ast = self.engine.env.parse(source, path.name, str(path))
+        except jinja2.TemplateSyntaxError as e:
+            issues.append(Issue(path, e.message or str(e), e.lineno))
+            return
+
+        for call in ast.find_all(nodes.Call):
+            node = call.node
+            if not (
+                isinstance(node, nodes.ExtensionAttribute)
+                and node.name == "_render_content"
+            ):
+                continue
+            arg = call.args[0]
+            # Computed paths can only be checked by rendering
+            if isinstance(arg, nodes.Const) and isinstance(arg.value, str):
+                target = self.extension.resolve_path(arg.value)
+                contents.append((target, path, call.lineno))
+
+        content_dir = self.env.content_dir.absolute
+        for name in meta.find_referenced_templates(ast):
+            if name is None:
+                continue
+            included = content_dir / name
+            if not included.exists():
+                issues.append(Issue(path, f"Template not found: {name}"))
+            else:
+                self._walk_template(included, contents, issues, seen)
+
+    def _check_content(
+        self, path: Path, template: Path, lineno: int
+    ) -> Tuple[List[Issue], List[Path]]:
+        """
+        Check a content file included with a content tag.
+
+        Args:
+            path: Path to the content file
+            template: Template including the file
+            lineno: Line of the content tag
+
+        Returns:
+            Tuple of the issues found and the styles used by the content
+        """
+        if not path.exists():
+            return [Issue(template, f"Content not found: {path}", lineno)], []
+        try:
+            self.engine.processor_factory.get_processor(path)
+        except ValueError as e:
+            return [Issue(template, str(e), lineno)], []
+
+        issues: List[Issue] = []
+        styles: List[Path] = []
+        if path.suffix.lower() in (".csv", ".jsonl"):
+            # Data files can be huge, only their row template is checked
+            if DataProcessor.row_template(path) is None:
+                issues.append(Issue(path, "Row template not found"))
+            return issues, [
+                style
+                for style in (
+                    path.with_suffix(".css"),
+                    path.with_suffix(".scss"),
+                    path.parent / "style.css",
+                    path.parent / "style.scss",
+                )
+                if style.exists()
+            ]
+
+        text = path.read_text(encoding="utf-8")
+        if path.suffix.lower() == ".md":
+            try:
+                metadata: Dict[str, Any]
+                metadata, text = frontmatter.parse(text)  # type: ignore
+            except Exception as e:
+                return [Issue(path, f"Invalid frontmatter: {e}")], []
+            for key, expected in FRONTMATTER_SCHEMA.items():
+                if key in metadata and not isinstance(metadata[key], expected):
+                    issues.append(
+                        Issue(
+                            path,
+                            f"Frontmatter '{key}' must be a "
+                            f"{expected.__name__}",
+                        )
+                    )
+            style = metadata.get("style")
+            if isinstance(style, str):
+                if not (path.parent / style).exists():
+                    issues.append(Issue(path, f"Style not found: {style}"))
+                else:
+                    styles.append(path.parent / style)
+        else:
+            for name in ("style.css", "style.scss"):
+                if (path.parent / name).exists():
+                    styles.append(path.parent / name)
+            for suffix in (".css", ".scss"):
+                if path.with_suffix(suffix).exists():
+                    styles.append(path.with_suffix(suffix))
+
+        references = [
+            "".join(groups[1:]) for groups in IMG_SRC_RE.findall(text)
+        ]
+        if path.suffix.lower() == ".md":
+            references.extend(MD_IMAGE_RE.findall(text))
+        issues.extend(self._check_references(path, references, "Image"))
+        return issues, styles
+
+    def _check_style(self, path: Path) -> List[Issue]:
+        """
+        Check the images and fonts referenced by a style file.
+
+        URLs computed by Sass expressions (`url($image)`...) can only be
+        checked once compiled, and are skipped.
+
+        Args:
+            path: Path to the style file
+
+        Returns:
+            Issues found
+        """
+        text = path.read_text(encoding="utf-8")
+        sass = path.suffix.lower() in (".scss", ".sass")
+        references = [
+            "".join(groups)
+            for groups in CSS_URL_RE.findall(text)
+            # Quoted URLs are plain strings, even in SCSS
+            if not (sass and SASS_EXPRESSION_RE.search(groups[2]))
+        ]
+        return self._check_references(path, references, "Resource")
+
+    def _check_references(
+        self, path: Path, references: List[str], kind: str
+    ) -> List[Issue]:
+        """
+        Check that local files referenced from a file exist, resolved the
+        way the build resolves them.
+
+        Args:
+            path: File holding the references
+            references: Referenced URLs
+            kind: Kind of resource, for the messages
+
+        Returns:
+            Issues found
+        """
+        issues: List[Issue] = []
+        for reference in references:
+            # Templated URLs can only be checked by rendering
+            if "{" in reference:
+                continue
+            # Remote, data: and fragment URLs are not checked
+            local = local_asset(reference, path.parent)
+            if local is not None and not local.exists():
+                issues.append(Issue(path, f"{kind} not found: {reference}"))
+        return issues
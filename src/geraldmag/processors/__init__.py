@@ -5,6 +5,7 @@ Processor factory for content processing.
 from pathlib import Path
 from typing import Dict, Type
 
+from .data import DataProcessor
 from .html import HTMLProcessor
 from .markdown import MarkdownProcessor
 from .types import PProcessor
@@ -18,6 +19,8 @@ class ProcessorFactory:
     PROCESSORS: Dict[str, Type[PProcessor]] = {
         ".md": MarkdownProcessor,
         ".html": HTMLProcessor,
+        ".csv": DataProcessor,
+        ".jsonl": DataProcessor,
     }
 
     @classmethod
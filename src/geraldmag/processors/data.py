@@ -0,0 +1,336 @@
+"""
+Data processor for GéraldMag.
+"""
+
+import csv
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+import jinja2
+
+from ..cache import artifact_key
+from ..context import PageContext
+
+
+class DataProcessor:
+    """
+    Processor for tabular data content files (.csv, .jsonl).
+
+    Rows are read one at a time and rendered with a row template, the
+    `<name>.row.html` (or `row.html`) Jinja template next to the data file,
+    which gets the row as `row` and its number as `index`. Rendered rows are
+    grouped in chunks of `data_chunk_rows` rows. Rows rendering to table
+    rows (`<tr>`) are put in a table, with the optional `<name>.head.html`
+    template as its header, repeated on every page; all rows must then have
+    the same columns. The whole is wrapped in an element carrying the scope
+    of the styles of the data file.
+
+    Chunks only serve the cache and the low-memory spool, which handle them
+    one at a time: they carry no pagination hint, and pages break between
+    and inside them as in a plain run of rows. Styles of the data file can
+    set `break-inside` or `break-before` on the rows or on `.data-chunk`.
+    """
+
+    def process(self, file_path: Path, context: PageContext) -> str:
+        """
+        Process a data file and return HTML.
+
+        Args:
+            file_path: Path to the data file to process
+            context: Page context for the processing
+
+        Returns:
+            Processed HTML content
+
+        Raises:
+            ValueError: If the data file has no row template
+        """
+        row_template = self.row_template(file_path)
+        if row_template is None:
+            raise ValueError(f"No row template for data file: {file_path}")
+        head_template = file_path.with_suffix(".head.html")
+        self._add_styles(file_path, context)
+
+        # The data file is hashed in blocks, never loaded whole
+        with file_path.open("rb") as f:
+            data_hash = hashlib.file_digest(f, "sha256").hexdigest()
+        # Keys the number of pieces, the pieces are keyed by it and their
+        # index
+        key = artifact_key(
+            "data-pieces",
+            data_hash,
+            file_path.suffix.lower(),
+            row_template.read_text(encoding="utf-8"),
+            (
+                head_template.read_text(encoding="utf-8")
+                if head_template.exists()
+                else ""
+            ),
+            str(context.env.data_chunk_rows),
+        )
+
+        # Pieces are spooled as they come in low-memory mode, only their
+        # placeholders are kept
+        pieces: List[str] = []
+        for piece in self._cached_pieces(
+            key,
+            lambda: self._render(
+                file_path, row_template, head_template, context
+            ),
+            context,
+        ):
+            # Images and the scope change with every build, they are not
+            # cached
+            piece = context.images.link_images(piece, file_path.parent)
+            if context.spool is not None:
+                piece = context.spool.spill(piece)
+            pieces.append(piece)
+        html = "\n".join(pieces)
+        return (
+            f'<div class="data" data-scope="{context.scope}">\n{html}\n</div>'
+        )
+
+    @staticmethod
+    def row_template(file_path: Path) -> Optional[Path]:
+        """
+        Find the row template of a data file.
+
+        Args:
+            file_path: Path to the data file
+
+        Returns:
+            Path to the row template, None if there is none
+        """
+        for candidate in (
+            file_path.with_suffix(".row.html"),
+            file_path.parent / "row.html",
+        ):
+            if candidate.exists():
+                return candidate
+        return None
+
+    def _cached_pieces(
+        self,
+        key: str,
+        render: Callable[[], Iterator[str]],
+        context: PageContext,
+    ) -> Iterator[str]:
+        """
+        Yield the rendered pieces of a data file, going through the cache.
+
+        Each piece is cached on its own, under the key of the data file and
+        its index, and the number of pieces under the key of the data file,
+        once they are all stored. If a piece is missing from the cache, the
+        data file is rendered again from the start, and the pieces already
+        yielded are skipped.
+
+        Args:
+            key: Artifact key of the data file
+            render: Function rendering the pieces of the data file
+            context: Page context for the processing
+
+        Yields:
+            Rendered pieces
+        """
+        done = 0
+        cached = context.cache.get(key)
+        if cached is not None:
+            for index in range(int(cached)):
+                piece = context.cache.get(
+                    artifact_key("data-piece", key, str(index))
+                )
+                if piece is None:
+                    break
+                yield piece.decode("utf-8")
+                done += 1
+            else:
+                return
+
+        count = 0
+        for index, piece in enumerate(render()):
+            context.cache.put(
+                artifact_key("data-piece", key, str(index)),
+                piece.encode("utf-8"),
+            )
+            count += 1
+            if index >= done:
+                yield piece
+        context.cache.put(key, str(count).encode("utf-8"))
+
+    def _render(
+        self,
+        file_path: Path,
+        row_template: Path,
+        head_template: Path,
+        context: PageContext,
+    ) -> Iterator[str]:
+        """
+        Render the rows of a data file in chunks.
+
+        Rows are rendered in a table when the first one renders to a table
+        row (`<tr>`). All rows of a table must then render to table rows,
+        and have the columns of the first one.
+
+        Args:
+            file_path: Path to the data file
+            row_template: Path to the row template
+            head_template: Path to the optional table header template
+            context: Page context for the processing
+
+        Yields:
+            Pieces of the rendered HTML content: the chunks, and the start
+            and end of the table around them
+
+        Raises:
+            ValueError: If a row of a table does not match the first one
+        """
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(str(file_path.parent)),
+            autoescape=jinja2.select_autoescape(["html", "xml"]),
+        )
+        template = env.get_template(row_template.name)
+        chunk_rows = max(1, context.env.data_chunk_rows)
+
+        rows: List[str] = []
+        columns: Optional[Set[str]] = None
+        table = False
+        index = 0
+        for index, row in enumerate(self._read_rows(file_path), 1):
+            html = template.render(row=row, index=index, page=context.page)
+            if index == 1:
+                table = html.lstrip().startswith("<tr")
+                if table:
+                    columns = set(row)
+                    yield self._table_start(head_template, env, context)
+            elif columns is not None:
+                self._check_table_row(file_path, index, row, html, columns)
+            rows.append(html)
+            if len(rows) == chunk_rows:
+                yield self._chunk(rows, index, table)
+                rows = []
+        if rows:
+            yield self._chunk(rows, index, table)
+        if table:
+            yield "</table>"
+
+    def _table_start(
+        self,
+        head_template: Path,
+        env: jinja2.Environment,
+        context: PageContext,
+    ) -> str:
+        """
+        Render the start of the table of a data file, with its header.
+
+        Args:
+            head_template: Path to the optional table header template
+            env: Jinja environment of the data file
+            context: Page context for the processing
+
+        Returns:
+            HTML of the start of the table
+        """
+        if not head_template.exists():
+            return "<table>"
+        head = env.get_template(head_template.name).render(page=context.page)
+        return f"<table>\n<thead>{head}</thead>"
+
+    def _check_table_row(
+        self,
+        file_path: Path,
+        index: int,
+        row: Dict[str, Any],
+        html: str,
+        columns: Set[str],
+    ) -> None:
+        """
+        Check that a row fits in the table started by the first row.
+
+        Args:
+            file_path: Path to the data file
+            index: Number of the row
+            row: Row, as a dictionary
+            html: Rendered row
+            columns: Columns of the first row
+
+        Raises:
+            ValueError: If the row has other columns than the first row, or
+                does not render to a table row
+        """
+        if set(row) != columns:
+            missing = ", ".join(sorted(map(str, columns - set(row))))
+            extra = ", ".join(sorted(map(str, set(row) - columns)))
+            raise ValueError(
+                f"Row {index} of {file_path} does not have the columns of "
+                f"the first row (missing: {missing or '-'}, "
+                f"extra: {extra or '-'})"
+            )
+        if not html.lstrip().startswith("<tr"):
+            raise ValueError(
+                f"Row {index} of {file_path} does not render to a table row "
+                "like the first row"
+            )
+
+    def _chunk(self, rows: List[str], last: int, table: bool) -> str:
+        """
+        Wrap rendered rows in a chunk element, the unit of caching and
+        spooling (it does not change pagination).
+
+        Args:
+            rows: Rendered rows of the chunk
+            last: Number of the last row of the chunk
+            table: If True, the rows are table rows
+
+        Returns:
+            HTML of the chunk
+        """
+        tag = "tbody" if table else "div"
+        first = last - len(rows) + 1
+        return (
+            f'<{tag} class="data-chunk" data-rows="{first}-{last}">\n'
+            + "\n".join(rows)
+            + f"\n</{tag}>"
+        )
+
+    def _read_rows(self, file_path: Path) -> Iterator[Dict[str, Any]]:
+        """
+        Read the rows of a data file one at a time.
+
+        Args:
+            file_path: Path to the data file
+
+        Yields:
+            Rows, as dictionaries
+        """
+        with file_path.open("r", encoding="utf-8-sig", newline="") as f:
+            if file_path.suffix.lower() == ".csv":
+                yield from csv.DictReader(f)
+                return
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(
+                        f"Invalid JSON in {file_path}:{lineno}: {e}"
+                    ) from e
+
+    def _add_styles(self, file_path: Path, context: PageContext) -> None:
+        """
+        Add any styles associated with this data file to the context.
+
+        Args:
+            file_path: Path to the data file
+            context: Page context
+        """
+        for style_path in (
+            file_path.with_suffix(".css"),
+            file_path.with_suffix(".scss"),
+            file_path.parent / "style.css",
+            file_path.parent / "style.scss",
+        ):
+            if style_path.exists():
+                context.styles.add_style(style_path, context.scope)
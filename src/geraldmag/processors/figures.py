@@ -0,0 +1,243 @@
+"""
+Math and diagram rendering for the Markdown processor.
+
+Fenced code blocks whose language is `math` (LaTeX-style math, rendered
+with matplotlib's mathtext) or `dot` (Graphviz diagrams, rendered with the
+local `dot` binary) are rendered to SVG images before the Markdown is
+converted. The SVGs are content-addressed: they are stored in the artifact
+cache and under `build_dir/.figures`, so that unchanged blocks are never
+rendered again.
+"""
+
+import functools
+import html
+import importlib.metadata
+import io
+import re
+import subprocess
+from typing import Callable, Dict, List, Tuple
+
+from ..cache import artifact_key
+from ..context import PageContext
+from ..fsutil import atomic_write
+
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})[ \t]*([\w-]*)[^\n]*$")
+
+# Placeholder URL of a figure, replaced once the figure is registered;
+# the key is stable across builds, unlike the image IDs
+FIGURE_URL_RE = re.compile(r'src="figure:([0-9a-f]{64})"')
+
+
+def render_math(source: str) -> bytes:
+    """
+    Render LaTeX-style math to SVG with matplotlib's mathtext.
+
+    Args:
+        source: Math expression, without the surrounding `$`
+
+    Returns:
+        SVG image
+
+    Raises:
+        RuntimeError: If matplotlib is not installed
+    """
+    try:
+        from matplotlib import mathtext  # type: ignore
+    except ImportError as e:
+        raise RuntimeError(
+            "Rendering math needs matplotlib: install it with "
+            "`pip install 'geraldmag[math]'`"
+        ) from e
+    output = io.BytesIO()
+    # mathtext only handles single-line expressions
+    expression = " ".join(source.split())
+    mathtext.math_to_image(  # type: ignore
+        f"${expression}$", output, format="svg"
+    )
+    return output.getvalue()
+
+
+def render_dot(source: str) -> bytes:
+    """
+    Render a Graphviz diagram to SVG with the local `dot` binary.
+
+    Args:
+        source: Diagram in the DOT language
+
+    Returns:
+        SVG image
+
+    Raises:
+        RuntimeError: If Graphviz is not installed or the diagram is invalid
+    """
+    try:
+        result = subprocess.run(
+            ["dot", "-Tsvg"],
+            input=source.encode("utf-8"),
+            capture_output=True,
+        )
+    except FileNotFoundError as e:
+        raise RuntimeError(
+            "Rendering diagrams needs Graphviz: install its `dot` binary"
+        ) from e
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"Invalid diagram: {result.stderr.decode('utf-8').strip()}"
+        )
+    return result.stdout
+
+
+# Renderers by language of the fenced block
+RENDERERS: Dict[str, Callable[[str], bytes]] = {
+    "math": render_math,
+    "dot": render_dot,
+}
+
+
+@functools.cache
+def renderer_version(lang: str) -> str:
+    """
+    Return the version of the renderer of a language (part of the cache
+    keys), empty if the renderer is not installed.
+    """
+    try:
+        if lang == "math":
+            return importlib.metadata.version("matplotlib")
+        result = subprocess.run(["dot", "-V"], capture_output=True)
+        return result.stderr.decode("utf-8").strip()
+    except (importlib.metadata.PackageNotFoundError, FileNotFoundError):
+        return ""
+
+
+def find_figures(content: str) -> List[Tuple[int, int, str, str]]:
+    """
+    Find the fenced math and diagram blocks of Markdown content.
+
+    Args:
+        content: Markdown content
+
+    Returns:
+        List of (start, end, language, source) of the blocks, start and end
+        being offsets in the content
+    """
+    figures: List[Tuple[int, int, str, str]] = []
+    fence = None
+    start = 0
+    lang = ""
+    body: List[str] = []
+    offset = 0
+    for line in content.splitlines(keepends=True):
+        match = FENCE_RE.match(line.rstrip("\r\n"))
+        if fence is None:
+            if match:
+                fence = match[1]
+                lang = match[2].lower()
+                start = offset
+                body = []
+        elif (
+            match
+            and not match[2]
+            and match[1][0] == fence[0]
+            and len(match[1]) >= len(fence)
+        ):
+            if lang in RENDERERS:
+                figures.append(
+                    (start, offset + len(line), lang, "".join(body))
+                )
+            fence = None
+        else:
+            body.append(line)
+        offset += len(line)
+    return figures
+
+
+def render_figures(content: str, context: PageContext) -> str:
+    """
+    Render the math and diagram blocks of Markdown content.
+
+    Each block is replaced with an image whose URL is a placeholder, to be
+    resolved with `link_figures` after the conversion of the Markdown (so
+    that the converted Markdown can be cached).
+
+    Args:
+        content: Markdown content
+        context: Page context for the processing
+
+    Returns:
+        Markdown content with images instead of the blocks
+    """
+    figures = find_figures(content)
+    if not figures:
+        return content
+
+    figures_dir = context.env.build_dir.absolute / ".figures"
+    keys: List[str] = []
+    misses: Dict[str, Tuple[str, str]] = {}
+    for _, _, lang, source in figures:
+        key = artifact_key("figure", lang, renderer_version(lang), source)
+        keys.append(key)
+        path = figures_dir / f"{key}.svg"
+        if path.exists() or key in misses:
+            continue
+        cached = context.cache.get(key)
+        if cached is not None:
+            atomic_write(path, cached)
+        else:
+            misses[key] = (lang, source)
+
+    if misses:
+        items = list(misses.items())
+        if len(items) > 1:
+            rendered = list(
+                context.pool.executor.map(
+                    _render,
+                    [lang for _, (lang, _) in items],
+                    [source for _, (_, source) in items],
+                )
+            )
+        else:
+            rendered = [_render(*items[0][1])]
+        for (key, _), svg in zip(items, rendered):
+            atomic_write(figures_dir / f"{key}.svg", svg)
+            context.cache.put(key, svg)
+
+    parts: List[str] = []
+    position = 0
+    for (start, end, lang, source), key in zip(figures, keys):
+        alt = html.escape(" ".join(source.split()))
+        parts.append(content[position:start])
+        parts.append(
+            f'\n<p class="figure-{lang}">'
+            f'<img src="figure:{key}" alt="{alt}"></p>\n\n'
+        )
+        position = end
+    parts.append(content[position:])
+    return "".join(parts)
+
+
+def link_figures(html_content: str, context: PageContext) -> str:
+    """
+    Register the figures of converted content with the image bucket and
+    point their images to it.
+
+    Args:
+        html_content: HTML converted from the output of `render_figures`
+        context: Page context for the processing
+
+    Returns:
+        HTML content with the final image URLs
+    """
+    figures_dir = context.env.build_dir.absolute / ".figures"
+
+    def link(match: re.Match[str]) -> str:
+        image_id = context.images.register_image(
+            figures_dir / f"{match[1]}.svg"
+        )
+        return f'src="images/{context.images.filename(image_id)}"'
+
+    return FIGURE_URL_RE.sub(link, html_content)
+
+
+def _render(lang: str, source: str) -> bytes:
+    """Render a block (module level so that it can run in a worker process)."""
+    return RENDERERS[lang](source)
@@ -23,8 +23,10 @@ class HTMLProcessor:
         Returns:
             Processed HTML content
         """
-        # Read the content
-        html_content = file_path.read_text(encoding="utf-8")
+        # Read the content, its images are relative to it
+        html_content = context.images.link_images(
+            file_path.read_text(encoding="utf-8"), file_path.parent
+        )
 
         # Check for associated style files
         self._add_styles(file_path, context)
@@ -32,7 +34,11 @@ class HTMLProcessor:
         # Process the content as a template if needed
         # (this will be handled by the Engine class)
 
-        return html_content
+        # The wrapper carries the scope of the styles of the file
+        return (
+            f'<div class="html" data-scope="{context.scope}">\n'
+            f"{html_content}\n</div>"
+        )
 
     def _add_styles(self, file_path: Path, context: PageContext) -> None:
         """
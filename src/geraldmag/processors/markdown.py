@@ -2,13 +2,108 @@
 Markdown processor for GéraldMag.
 """
 
+import re
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, List
 
 import frontmatter  # type: ignore
 import markdown
 
+from ..cache import artifact_key
 from ..context import PageContext
+from .figures import link_figures, render_figures
+
+EXTENSIONS = ["fenced_code", "codehilite"]
+
+# Sections smaller than this are converted together with the next one
+MIN_CHUNK_SIZE = 4 * 1024
+
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+HEADING_RE = re.compile(r"^#{1,2}(\s|$)")
+REFERENCE_RE = re.compile(r"^ {0,3}\[([^\]^][^\]]*)\]:\s*\S")
+# Bracketed text of a chunk: link texts and labels, either may be a
+# reference (`[text][label]`, `[label][]`, `[label]`)
+BRACKETS_RE = re.compile(r"\[([^\[\]]+)\]")
+
+
+def _convert(content: str) -> str:
+    """
+    Convert Markdown content to HTML (module level so that it can run in a
+    worker process).
+    """
+    return markdown.markdown(content, extensions=EXTENSIONS)
+
+
+def _label(text: str) -> str:
+    """Normalize a reference label: case and whitespace do not matter."""
+    return " ".join(text.split()).lower()
+
+
+def split_markdown(content: str, min_size: int) -> list[str]:
+    """
+    Split Markdown content into chunks at top-level headings.
+
+    Chunks start at level 1 or 2 ATX headings (`#` and `##`, outside of
+    fenced code). Setext headings are not split on: their text can span
+    several lines, which cannot be told apart from the paragraph above
+    without parsing it. Sections smaller than `min_size` are glued to the
+    next one; this only depends on the size of each section, so editing a
+    section does not move the boundaries of the other chunks (and their
+    cache entries stay valid). Reference link definitions are taken out of
+    the text and appended to the chunks that refer to them, so that links
+    resolve across chunks and a chunk only changes with its own
+    references.
+
+    Args:
+        content: Markdown content
+        min_size: Size (in characters) under which a section is glued to
+            the next one
+
+    Returns:
+        Chunks, each followed by the reference definitions it uses
+    """
+    sections: List[List[str]] = [[]]
+    definitions: Dict[str, str] = {}
+    fence = None
+    for line in content.splitlines(keepends=True):
+        match = FENCE_RE.match(line)
+        if fence is not None:
+            if (
+                match
+                and match[1][0] == fence[0]
+                and len(match[1]) >= len(fence)
+            ):
+                fence = None
+        elif match:
+            fence = match[1]
+        elif reference := REFERENCE_RE.match(line):
+            # The last definition of a label wins, as in Python-Markdown
+            definitions[_label(reference[1])] = line
+            continue
+        elif HEADING_RE.match(line):
+            sections.append([])
+        sections[-1].append(line)
+
+    chunks: List[str] = []
+    current = ""
+    for section in sections:
+        text = "".join(section)
+        current += text
+        if len(text) >= min_size:
+            chunks.append(current)
+            current = ""
+    if current or not chunks:
+        chunks.append(current)
+
+    sources: List[str] = []
+    for chunk in chunks:
+        labels = {_label(text) for text in BRACKETS_RE.findall(chunk)}
+        used = "".join(
+            line for label, line in definitions.items() if label in labels
+        )
+        # Separate reference definitions from the text with a blank line
+        sources.append(f"{chunk}\n\n{used}" if used else chunk)
+    return sources
 
 
 class MarkdownProcessor:
@@ -33,8 +128,12 @@ class MarkdownProcessor:
         # Update context with frontmatter
         context.page = frontmatter_data
 
-        # Convert Markdown to HTML
-        html_content = self._markdown_to_html(content)
+        # Render math and diagrams, then convert Markdown to HTML
+        content = render_figures(content, context)
+        html_content = context.images.link_images(
+            self._markdown_to_html(content, context), file_path.parent
+        )
+        html_content = link_figures(html_content, context)
         context.content = html_content
 
         # Process any style file referenced in frontmatter
@@ -61,23 +160,58 @@ class MarkdownProcessor:
             metadata, content = frontmatter.parse(f.read())
         return metadata, content
 
-    def _markdown_to_html(self, content: str) -> str:
+    def _markdown_to_html(self, content: str, context: PageContext) -> str:
         """
-        Convert Markdown content to HTML.
+        Convert Markdown content to HTML, going through the artifact cache.
+
+        Content larger than `markdown_split_size` is split at top-level
+        headings, and the chunks are converted (and cached) separately, in
+        parallel in the worker pool of the build.
 
         Args:
             content: Markdown content
+            context: Page context for the processing
 
         Returns:
             HTML content
         """
-        return markdown.markdown(
-            content, extensions=["fenced_code", "codehilite"]
-        )
+        split_size = context.env.markdown_split_size
+        if split_size and len(content) > split_size:
+            sources = split_markdown(content, MIN_CHUNK_SIZE)
+        else:
+            sources = [content]
+
+        keys = [
+            artifact_key(
+                "markdown", markdown.__version__, ",".join(EXTENSIONS), source
+            )
+            for source in sources
+        ]
+        results: Dict[int, str] = {}
+        misses: List[int] = []
+        for index, key in enumerate(keys):
+            cached = context.cache.get(key)
+            if cached is not None:
+                results[index] = cached.decode("utf-8")
+            else:
+                misses.append(index)
+
+        if len(misses) > 1:
+            converted = context.pool.executor.map(
+                _convert, [sources[i] for i in misses], chunksize=4
+            )
+            results.update(zip(misses, converted))
+        elif misses:
+            results[misses[0]] = _convert(sources[misses[0]])
+
+        for index in misses:
+            context.cache.put(keys[index], results[index].encode("utf-8"))
+        return "\n".join(results[index] for index in range(len(sources)))
 
     def _make_article(self, context: PageContext) -> str:
         """
-        Apply template to the article content.
+        Wrap the article content in its article element, which carries
+        the scope of the article's styles.
 
         Args:
             context: Page context with content and frontmatter
@@ -85,4 +219,7 @@ class MarkdownProcessor:
         Returns:
             Final HTML for the article
         """
-        return ""
+        return (
+            f'<article class="article" data-scope="{context.scope}">\n'
+            f"{context.content}\n</article>"
+        )
@@ -0,0 +1,166 @@
+"""
+Output profiles for GéraldMag.
+
+A profile is a named set of PDF output settings (image resolution, font
+embedding, compression, linearization...). The built-in `print`, `web` and
+`proof` profiles can be changed, and new profiles added, in the `profiles`
+table of `mag.toml` or `pub.toml`.
+"""
+
+import io
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .env import Environment
+from .fsutil import atomic_open
+
+try:
+    import pikepdf  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    pikepdf = None
+
+BUILTIN_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Print master: untouched images, fonts embedded in full
+    "print": {"full_fonts": True},
+    # Web download: lighter images, linearized for fast first-page display
+    "web": {
+        "dpi": 150,
+        "jpeg_quality": 85,
+        "optimize_images": True,
+        "linearize": True,
+    },
+    # Editorial proof: as small and fast as possible
+    "proof": {"dpi": 96, "jpeg_quality": 60, "optimize_images": True},
+}
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """
+    Settings of a PDF output.
+
+    Args:
+        name: Name of the profile
+        dpi: Maximum resolution of the images, None for no limit
+        jpeg_quality: Quality of the JPEG images (0-95), None to keep them
+        optimize_images: If True, recompress the images to make them smaller
+        full_fonts: If True, embed whole fonts instead of subsets
+        hinting: If True, keep the hinting of the embedded fonts
+        compress: If True, compress the streams and group the objects in
+            object streams
+        linearize: If True, linearize the PDF so that its first page shows
+            before it is fully downloaded (needs pikepdf, ignored with a
+            warning without it)
+        pdf_version: Version of the PDF, None for the WeasyPrint default
+    """
+
+    name: str
+    dpi: Optional[int] = None
+    jpeg_quality: Optional[int] = None
+    optimize_images: bool = False
+    full_fonts: bool = False
+    hinting: bool = False
+    compress: bool = True
+    linearize: bool = False
+    pdf_version: Optional[str] = None
+
+    def layout_options(self) -> Tuple[Tuple[str, Any], ...]:
+        """
+        Return the WeasyPrint options applied when laying the pages out.
+
+        WeasyPrint processes the images while laying the pages out, so
+        profiles with different image settings need their own layout.
+
+        Returns:
+            Hashable (option, value) pairs
+        """
+        return (
+            ("dpi", self.dpi),
+            ("jpeg_quality", self.jpeg_quality),
+            ("optimize_images", self.optimize_images),
+        )
+
+    def write_options(self) -> Dict[str, Any]:
+        """
+        Return the WeasyPrint options applied when writing the PDF.
+
+        Returns:
+            Keyword arguments of `Document.write_pdf`
+        """
+        return {
+            "full_fonts": self.full_fonts,
+            "hinting": self.hinting,
+            "uncompressed_pdf": not self.compress,
+            "pdf_version": self.pdf_version,
+        }
+
+    def write(self, document: Any, output_file: Path) -> None:
+        """
+        Write a rendered document to a PDF file with the profile settings.
+
+        Args:
+            document: Rendered WeasyPrint document
+            output_file: Path of the PDF file
+        """
+        if not self.linearize:
+            with atomic_open(output_file) as f:
+                document.write_pdf(f, **self.write_options())
+            return
+
+        data = document.write_pdf(**self.write_options())
+        with pikepdf.open(io.BytesIO(data)) as pdf:  # type: ignore
+            with atomic_open(output_file) as f:
+                pdf.save(  # type: ignore
+                    f,
+                    linearize=True,
+                    compress_streams=self.compress,
+                    object_stream_mode=(
+                        pikepdf.ObjectStreamMode.generate  # type: ignore
+                        if self.compress
+                        else pikepdf.ObjectStreamMode.disable  # type: ignore
+                    ),
+                )
+
+
+def get_profiles(env: Environment) -> List[OutputProfile]:
+    """
+    Get the output profiles selected by `output_profiles`.
+
+    Args:
+        env: Environment configuration
+
+    Returns:
+        Selected profiles, a single default profile (WeasyPrint defaults)
+        named "" if none is selected
+
+    Raises:
+        ValueError: If a profile is unknown or has an unknown setting
+    """
+    if not env.output_profiles:
+        return [OutputProfile("")]
+
+    known = {field.name for field in fields(OutputProfile)} - {"name"}
+    profiles: List[OutputProfile] = []
+    for name in env.output_profiles:
+        if name not in BUILTIN_PROFILES and name not in env.profiles:
+            raise ValueError(f"Unknown output profile: {name}")
+        settings = {
+            **BUILTIN_PROFILES.get(name, {}),
+            **env.profiles.get(name, {}),
+        }
+        unknown = set(settings) - known
+        if unknown:
+            raise ValueError(
+                f"Unknown setting(s) in output profile '{name}': "
+                + ", ".join(sorted(unknown))
+            )
+        profile = OutputProfile(name, **settings)
+        if profile.linearize and pikepdf is None:
+            print(
+                f"Warning: Output profile '{name}' is not linearized, "
+                "pikepdf is not installed (pip install 'geraldmag[pdf]')"
+            )
+            profile = replace(profile, linearize=False)
+        profiles.append(profile)
+    return profiles
@@ -0,0 +1,291 @@
+"""
+Build report for GéraldMag.
+
+Tells where the size and the build time of a publication go: bytes of the
+PDF by article (content streams, images, fonts), pages and processing time
+by article, largest assets, most duplicated stylesheets and heaviest
+embedded fonts. The report is written as JSON and as HTML.
+"""
+
+import importlib.resources
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import jinja2
+
+from . import templates
+from .articles import Article
+from .context import Context
+from .fsutil import atomic_write
+from .memory import peak_rss
+from .scheduler import stage_timeline
+
+try:
+    import pikepdf  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    pikepdf = None
+
+# Number of entries of the "largest" and "heaviest" lists
+TOP = 20
+
+
+@dataclass
+class PageBytes:
+    """
+    Bytes of a PDF attributed to a page.
+
+    Objects shared between pages (images, fonts) are attributed to the
+    first page using them.
+    """
+
+    content: int = 0
+    images: int = 0
+    fonts: int = 0
+
+    def add(self, other: "PageBytes") -> None:
+        """Add the bytes of another page."""
+        self.content += other.content
+        self.images += other.images
+        self.fonts += other.fonts
+
+
+@dataclass
+class PdfAnalysis:
+    """
+    Bytes of a PDF by page and by embedded font.
+    """
+
+    pages: List[PageBytes] = field(default_factory=list)
+    fonts: Dict[str, int] = field(default_factory=dict)
+
+
+def analyze_pdf(pdf_file: Path) -> Optional[PdfAnalysis]:
+    """
+    Attribute the bytes of a PDF to its pages.
+
+    Args:
+        pdf_file: Path to the PDF file
+
+    Returns:
+        Analysis of the PDF, None if pikepdf is not installed
+    """
+    if pikepdf is None:
+        return None
+    analysis = PdfAnalysis()
+    seen: Set[Tuple[int, int]] = set()
+    with pikepdf.open(pdf_file) as pdf:  # type: ignore
+        for page in pdf.pages:  # type: ignore
+            page_bytes = PageBytes()
+            contents: Any = page.obj.get("/Contents")  # type: ignore
+            if contents is not None:
+                streams = (
+                    contents
+                    if isinstance(contents, pikepdf.Array)  # type: ignore
+                    else [contents]
+                )
+                for stream in streams:
+                    page_bytes.content += _stream_size(stream, seen)
+            resources: Any = page.obj.get("/Resources")  # type: ignore
+            _walk_resources(resources, page_bytes, analysis.fonts, seen)
+            analysis.pages.append(page_bytes)
+    return analysis
+
+
+def _stream_size(stream: Any, seen: Set[Tuple[int, int]]) -> int:
+    """
+    Return the size of a stream, 0 if it was already counted.
+
+    Args:
+        stream: pikepdf stream object
+        seen: Identifiers of the objects already counted
+
+    Returns:
+        Size of the compressed stream, in bytes
+    """
+    if stream is None:
+        return 0
+    if stream.is_indirect:
+        if stream.objgen in seen:
+            return 0
+        seen.add(stream.objgen)
+    return len(stream.read_raw_bytes())
+
+
+def _walk_resources(
+    resources: Any,
+    page_bytes: PageBytes,
+    fonts: Dict[str, int],
+    seen: Set[Tuple[int, int]],
+) -> None:
+    """
+    Count the images and fonts of a resource dictionary, recursively.
+
+    Args:
+        resources: pikepdf resource dictionary, or None
+        page_bytes: Bytes of the page using the resources
+        fonts: Bytes by embedded font
+        seen: Identifiers of the objects already counted
+    """
+    if resources is None:
+        return
+    for _, xobject in (resources.get("/XObject") or {}).items():
+        if xobject.get("/Subtype") == "/Image":
+            page_bytes.images += _stream_size(xobject, seen)
+            page_bytes.images += _stream_size(xobject.get("/SMask"), seen)
+        elif xobject.is_indirect and xobject.objgen not in seen:
+            # Form XObjects hold drawings with their own resources
+            page_bytes.content += _stream_size(xobject, seen)
+            _walk_resources(xobject.get("/Resources"), page_bytes, fonts, seen)
+    for _, font in (resources.get("/Font") or {}).items():
+        descendants = font.get("/DescendantFonts") or [font]
+        for descendant in descendants:
+            descriptor = descendant.get("/FontDescriptor")
+            if descriptor is None:
+                continue
+            for key in ("/FontFile", "/FontFile2", "/FontFile3"):
+                size = _stream_size(descriptor.get(key), seen)
+                if size:
+                    name = str(font.get("/BaseFont", "?")).lstrip("/")
+                    # Subset fonts are named ABCDEF+Name
+                    name = name.split("+", 1)[-1]
+                    fonts[name] = fonts.get(name, 0) + size
+                    page_bytes.fonts += size
+
+
+def build_report(
+    context: Context,
+    pdf_file: Path,
+    ranges: List[Tuple[Article, int, int]],
+    page_count: int,
+    timings: Dict[str, Tuple[float, float]],
+) -> Dict[str, Any]:
+    """
+    Build the report of a publication.
+
+    Args:
+        context: Context of the build
+        pdf_file: Path to the PDF of the publication
+        ranges: Articles with their first and last page
+        page_count: Number of pages of the publication
+        timings: Start and end time of the build stages
+
+    Returns:
+        Report, as JSON-serializable data
+    """
+    notes: List[str] = []
+    analysis = analyze_pdf(pdf_file)
+    if analysis is None:
+        notes.append(
+            "Install pikepdf to attribute the bytes of the PDF to articles "
+            "and fonts."
+        )
+
+    articles: List[Dict[str, Any]] = []
+    covered: Set[int] = set()
+    for article, first, last in ranges:
+        entry: Dict[str, Any] = {
+            "name": article.name,
+            "path": str(article.path),
+            "title": article.title,
+            "first_page": first + 1,
+            "last_page": last + 1,
+            "pages": last - first + 1,
+            "render_time": round(article.render_time, 3),
+            "bytes": None,
+        }
+        if analysis is not None:
+            total = PageBytes()
+            for number in range(first, last + 1):
+                if number not in covered:
+                    total.add(analysis.pages[number])
+            entry["bytes"] = vars(total)
+        covered.update(range(first, last + 1))
+        articles.append(entry)
+
+    other: Optional[Dict[str, int]] = None
+    if analysis is not None:
+        total = PageBytes()
+        for number, page_bytes in enumerate(analysis.pages):
+            if number not in covered:
+                total.add(page_bytes)
+        other = vars(total)
+
+    return {
+        "publication": context.publication,
+        "output": str(pdf_file),
+        "bytes": pdf_file.stat().st_size,
+        "pages": page_count,
+        "stages": {
+            name: {"start": round(start, 3), "duration": round(end - start, 3)}
+            for name, start, end in stage_timeline(timings)
+        },
+        "articles": articles,
+        # Over the lifetime of the process, not of this build alone
+        "process_peak_rss": peak_rss(),
+        "children_peak_rss": peak_rss(children=True),
+        # Pages outside of any article (covers, tables of contents...)
+        "other_bytes": other,
+        "largest_images": _largest(context.images.paths()),
+        "largest_fonts": _largest(context.fonts.paths()),
+        "duplicated_styles": [
+            {"path": str(path), "count": count, "bytes": size}
+            for path, (count, size) in sorted(
+                context.styles.usage().items(),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+            if count > 1
+        ][:TOP],
+        "embedded_fonts": (
+            None
+            if analysis is None
+            else [
+                {"name": name, "bytes": size}
+                for name, size in sorted(
+                    analysis.fonts.items(),
+                    key=lambda item: item[1],
+                    reverse=True,
+                )
+            ][:TOP]
+        ),
+        "notes": notes,
+    }
+
+
+def write_report(report: Dict[str, Any], json_file: Path, html_file: Path):
+    """
+    Write a report as JSON and as HTML.
+
+    Args:
+        report: Report returned by `build_report`
+        json_file: Path of the JSON file
+        html_file: Path of the HTML file
+    """
+    atomic_write(json_file, json.dumps(report, indent=2))
+    source = (
+        importlib.resources.files(templates)
+        .joinpath("report")
+        .joinpath("report.html")
+        .read_text(encoding="utf-8")
+    )
+    env = jinja2.Environment(autoescape=True)
+    atomic_write(html_file, env.from_string(source).render(report=report))
+
+
+def _largest(paths: List[Path]) -> List[Dict[str, Any]]:
+    """
+    List the largest files.
+
+    Args:
+        paths: Paths to the files
+
+    Returns:
+        The TOP largest files with their size, largest first
+    """
+    sizes = [(path.stat().st_size, path) for path in set(paths)]
+    return [
+        {"path": str(path), "bytes": size}
+        for size, path in sorted(sizes, reverse=True)[:TOP]
+    ]
@@ -0,0 +1,231 @@
+"""
+Scaffolding of projects and publications from template directories.
+
+Template sets can hold hundreds of megabytes of fonts and images. Their
+files are cloned in parallel: reflinks where the file system supports
+them, else hard links for the files that are not meant to be edited, else
+copies. A manifest of the scaffolded files, with their digests, is written
+next to them: scaffolding again with `--force` skips the files that did
+not change without hashing them again, and the digests tell which files
+are shared with the template set.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .fsutil import atomic_write, clone_file
+
+# Manifest of the scaffolded files, at the root of the target
+MANIFEST = ".geraldmag-template.json"
+
+# Files meant to be edited are never hard linked, editing them in place
+# would edit the template set
+EDITABLE_SUFFIXES = {
+    ".css",
+    ".csv",
+    ".html",
+    ".json",
+    ".jsonl",
+    ".md",
+    ".sass",
+    ".scss",
+    ".toml",
+    ".txt",
+}
+
+
+@dataclass
+class ScaffoldStats:
+    """
+    Files handled by a scaffolding, by outcome.
+    """
+
+    reflink: int = 0
+    hardlink: int = 0
+    copy: int = 0
+    # Unchanged since they were scaffolded, with --force
+    unchanged: int = 0
+    # Already there and kept, without --force
+    existing: int = 0
+
+    @property
+    def copied(self) -> int:
+        """Number of files copied, however they were."""
+        return self.reflink + self.hardlink + self.copy
+
+    def summary(self) -> str:
+        """Describe the outcome in one line, for the commands."""
+        summary = f"{self.copied} file(s) copied"
+        links = [
+            f"{count} {label}"
+            for count, label in (
+                (self.reflink, "reflinked"),
+                (self.hardlink, "hard linked"),
+            )
+            if count
+        ]
+        if links:
+            summary += f" ({', '.join(links)})"
+        if self.unchanged:
+            summary += f", {self.unchanged} unchanged"
+        if self.existing:
+            summary += f", {self.existing} existing file(s) kept"
+        return summary
+
+
+def scaffold(
+    source: Path,
+    target: Path,
+    force: bool = False,
+    workers: int = 0,
+    hardlink: bool = True,
+) -> ScaffoldStats:
+    """
+    Copy a template directory into a target directory.
+
+    Args:
+        source: Template directory
+        target: Directory to scaffold, created if needed
+        force: If True, overwrite the files that already exist (those that
+            did not change since they were scaffolded are skipped)
+        workers: Number of files copied in parallel, 0 for the default
+        hardlink: If False, never hard link files (e.g. from an installed
+            package, which must not change)
+
+    Returns:
+        Files handled, by outcome
+    """
+    files: List[str] = []
+    for root, dirs, names in os.walk(source):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        rel_root = Path(root).relative_to(source)
+        # Empty directories are part of the template too
+        (target / rel_root).mkdir(parents=True, exist_ok=True)
+        files.extend(
+            (rel_root / name).as_posix()
+            for name in sorted(names)
+            if name != MANIFEST
+        )
+
+    manifest_path = target / MANIFEST
+    manifest = _load_manifest(manifest_path, source)
+
+    with ThreadPoolExecutor(max_workers=workers or None) as pool:
+        results = list(
+            pool.map(
+                lambda rel: _place(
+                    source / rel,
+                    target / rel,
+                    manifest.get(rel),
+                    force,
+                    hardlink,
+                ),
+                files,
+            )
+        )
+
+    stats = ScaffoldStats()
+    entries: Dict[str, Dict[str, Any]] = {}
+    for rel, (outcome, entry) in zip(files, results):
+        setattr(stats, outcome, getattr(stats, outcome) + 1)
+        if entry is not None:
+            entries[rel] = entry
+    atomic_write(
+        manifest_path,
+        json.dumps(
+            {"source": str(source.absolute()), "files": entries}, indent=2
+        ),
+    )
+    return stats
+
+
+def _load_manifest(path: Path, source: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Load the entries of a manifest written from the same template directory.
+
+    Args:
+        path: Path to the manifest
+        source: Template directory
+
+    Returns:
+        Entries by relative path, empty if there is no usable manifest
+    """
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("source") != str(source.absolute()):
+        return {}
+    return manifest.get("files", {})
+
+
+def _place(
+    src: Path,
+    dst: Path,
+    entry: Optional[Dict[str, Any]],
+    force: bool,
+    hardlink: bool,
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Copy a template file, unless it is already in place.
+
+    Args:
+        src: Path to the template file
+        dst: Path of the copy
+        entry: Manifest entry of the previous scaffolding, if any
+        force: If True, overwrite an existing copy
+        hardlink: If False, never hard link the file
+
+    Returns:
+        Tuple of the outcome (a ScaffoldStats field) and the manifest entry
+    """
+    stat = src.stat()
+    if dst.exists():
+        if not force:
+            return "existing", entry
+        dst_stat = dst.stat()
+        # Copies keep the size and time of their source: matching stats
+        # mean unchanged files, which are not hashed again
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size == dst_stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns == dst_stat.st_mtime_ns
+        ):
+            return "unchanged", entry
+        digest = _digest(src)
+        if dst_stat.st_size == stat.st_size and _digest(dst) == digest:
+            dst.chmod(stat.st_mode)
+            os.utime(dst, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            return "unchanged", _entry(stat, digest, entry)
+    else:
+        digest = _digest(src)
+
+    method = clone_file(
+        src,
+        dst,
+        hardlink=hardlink and src.suffix.lower() not in EDITABLE_SUFFIXES,
+    )
+    return method, _entry(stat, digest, {"method": method})
+
+
+def _entry(
+    stat: os.stat_result, digest: str, previous: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Build the manifest entry of a template file."""
+    return {
+        "digest": digest,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "method": (previous or {}).get("method", "copy"),
+    }
+
+
+def _digest(path: Path) -> str:
+    """Return the SHA-256 digest of a file, hashed in blocks."""
+    with path.open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
@@ -0,0 +1,212 @@
+"""
+Task-graph scheduler for the build stages.
+
+Tasks are plain functions run in a thread pool once their dependencies are
+done. Tasks can be added while the graph runs, including from other
+threads (e.g. while a template renders), so that work starts as soon as it
+is known. A concurrency budget (number of threads) and a memory budget
+(sum of the estimated memory of running tasks) bound the parallelism.
+"""
+
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+
+def stage_timeline(
+    timings: Dict[str, Tuple[float, float]],
+) -> List[Tuple[str, float, float]]:
+    """
+    Order the timings of a task graph and make them relative to its start.
+
+    Args:
+        timings: Start and end time of the tasks, as in `TaskGraph.timings`
+
+    Returns:
+        Name, start and end of the tasks (in seconds since the first one
+        started), in start order
+    """
+    origin = min((start for start, _ in timings.values()), default=0.0)
+    return [
+        (name, start - origin, end - origin)
+        for name, (start, end) in sorted(
+            timings.items(), key=lambda item: item[1]
+        )
+    ]
+
+
+class MemoryBudget:
+    """
+    Counter of the memory reserved by running tasks.
+
+    A task larger than the whole budget still runs, alone.
+    """
+
+    def __init__(self, budget: int):
+        """
+        Initialize the budget.
+
+        Args:
+            budget: Memory available to tasks in bytes, 0 for no limit
+        """
+        self.budget = budget
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, amount: int) -> None:
+        """Wait until `amount` bytes can be reserved, then reserve them."""
+        if not self.budget:
+            return
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self.used == 0 or self.used + amount <= self.budget
+            )
+            self.used += amount
+
+    async def release(self, amount: int) -> None:
+        """Release `amount` bytes reserved with `acquire`."""
+        if not self.budget:
+            return
+        async with self._condition:
+            self.used -= amount
+            self._condition.notify_all()
+
+
+class TaskGraph:
+    """
+    Runs named tasks in dependency order, in parallel when possible.
+
+    Must be created from a running event loop.
+    """
+
+    def __init__(self, max_workers: int = 0, memory_budget: int = 0):
+        """
+        Initialize the task graph.
+
+        Args:
+            max_workers: Number of tasks running at once, 0 for the default
+                of ThreadPoolExecutor
+            memory_budget: Memory available to tasks in bytes, 0 for no limit
+        """
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or None)
+        self._memory = MemoryBudget(memory_budget)
+        self._tasks: Dict[str, asyncio.Task[Any]] = {}
+        self.timings: Dict[str, Tuple[float, float]] = {}
+
+    def add(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        *args: Any,
+        deps: Iterable[str] = (),
+        memory: int = 0,
+    ) -> str:
+        """
+        Add a task to the graph. Must be called from the event loop thread.
+
+        Args:
+            name: Unique name of the task
+            func: Function to run
+            *args: Arguments of the function
+            deps: Names of the tasks that must be done first
+            memory: Estimated memory used by the task, in bytes
+
+        Returns:
+            Name of the task
+        """
+        if name in self._tasks:
+            raise ValueError(f"Duplicate task: {name}")
+        waits = [self._tasks[dep] for dep in deps]
+        self._tasks[name] = self._loop.create_task(
+            self._run(name, func, args, waits, memory)
+        )
+        return name
+
+    def add_threadsafe(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        *args: Any,
+        deps: Iterable[str] = (),
+        memory: int = 0,
+    ) -> None:
+        """
+        Add a task to the graph from any thread (see `add`).
+        """
+
+        def add() -> None:
+            self.add(name, func, *args, deps=list(deps), memory=memory)
+
+        self._loop.call_soon_threadsafe(add)
+
+    def timings_snapshot(self) -> Dict[str, Tuple[float, float]]:
+        """
+        Return a copy of the timings of the tasks done so far, from any
+        thread.
+
+        The timings are recorded on the event loop thread, where they are
+        copied: iterating them from a task would race the tasks ending in
+        the meantime.
+        """
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                return dict(self.timings)
+        except RuntimeError:
+            pass
+        copy: Future[Dict[str, Tuple[float, float]]] = Future()
+        self._loop.call_soon_threadsafe(
+            lambda: copy.set_result(dict(self.timings))
+        )
+        return copy.result()
+
+    def names(self) -> List[str]:
+        """Return the names of all the tasks added so far."""
+        return list(self._tasks)
+
+    async def wait(self, *names: str) -> List[Any]:
+        """
+        Wait for tasks and return their results.
+
+        Args:
+            *names: Names of the tasks
+
+        Returns:
+            Results of the tasks, in the same order
+        """
+        return list(await asyncio.gather(*(self._tasks[n] for n in names)))
+
+    async def join(self) -> None:
+        """
+        Wait for all the tasks, including those added in the meantime.
+        """
+        while pending := [t for t in self._tasks.values() if not t.done()]:
+            await asyncio.gather(*pending)
+        # Surface the errors of tasks that nobody waited for
+        await asyncio.gather(*self._tasks.values())
+
+    def close(self) -> None:
+        """Shut the thread pool down."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        args: Tuple[Any, ...],
+        waits: List["asyncio.Task[Any]"],
+        memory: int,
+    ) -> Any:
+        """Run a task once its dependencies are done."""
+        await asyncio.gather(*waits)
+        await self._memory.acquire(memory)
+        try:
+            start = time.perf_counter()
+            result = await self._loop.run_in_executor(
+                self._executor, func, *args
+            )
+            self.timings[name] = (start, time.perf_counter())
+            return result
+        finally:
+            await self._memory.release(memory)
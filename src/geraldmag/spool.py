@@ -0,0 +1,124 @@
+"""
+Fragment spool for the low-memory mode.
+
+Processed content fragments are appended to a spool file as they are
+produced, and only a small placeholder goes through the templates. The
+final HTML is then streamed to disk, with the placeholders replaced by the
+fragments read back from a memory map of the spool file.
+"""
+
+import gc
+import mmap
+import re
+from pathlib import Path
+from typing import IO, Iterable, Optional
+
+from .memory import current_rss
+
+PLACEHOLDER_RE = re.compile(rb"<!--geraldmag-spool:(\d+):(\d+)-->")
+
+
+class Spool:
+    """
+    Spool file holding processed content fragments.
+    """
+
+    def __init__(self, path: Path, spill_threshold: int = 0):
+        """
+        Initialize the spool.
+
+        Args:
+            path: Path of the spool file, created (or emptied) on first use
+            spill_threshold: RSS in bytes from which fragments are spilled
+                to the spool, 0 to always spill them. This is not a ceiling:
+                the process keeps growing past it, by the fragments it still
+                has to process
+        """
+        self.path = path
+        self.spill_threshold = spill_threshold
+        self.spilled = 0
+        self._file: Optional[IO[bytes]] = None
+        self._size = 0
+        self._map: Optional[mmap.mmap] = None
+
+    def spill(self, fragment: str) -> str:
+        """
+        Move a fragment to the spool file, if memory is short.
+
+        Args:
+            fragment: Processed content fragment
+
+        Returns:
+            Placeholder of the fragment, or the fragment itself if it was
+            kept in memory
+        """
+        if self.spill_threshold:
+            rss = current_rss()
+            if rss is None or rss < self.spill_threshold:
+                return fragment
+            # Give what the previous fragments used back first
+            gc.collect()
+
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("w+b")
+            self._size = 0
+        data = fragment.encode("utf-8")
+        self._file.write(data)
+        placeholder = f"<!--geraldmag-spool:{self._size}:{len(data)}-->"
+        self._size += len(data)
+        self.spilled += 1
+        return placeholder
+
+    def write_expanded(self, chunks: Iterable[str], output: IO[bytes]) -> None:
+        """
+        Write rendered output, replacing placeholders with their fragments.
+
+        Args:
+            chunks: Rendered output, as produced by the template
+            output: Binary file to write to
+        """
+        try:
+            for chunk in chunks:
+                self._expand(chunk.encode("utf-8"), output)
+        finally:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+    def _expand(self, data: bytes, output: IO[bytes]) -> None:
+        """
+        Write data, replacing placeholders with their fragments.
+
+        Fragments can hold placeholders of their own (those of the chunks
+        of a data file), which are expanded in turn.
+
+        Args:
+            data: UTF-8 data to write
+            output: Binary file to write to
+        """
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(data):
+            output.write(data[position : match.start()])
+            position = match.end()
+            offset, length = int(match[1]), int(match[2])
+            if not length or self._file is None:
+                continue
+            # Chunks are rendered lazily: fragments keep being spilled
+            # while the output is written, the map is extended to reach them
+            if self._map is None or len(self._map) < offset + length:
+                if self._map is not None:
+                    self._map.close()
+                self._file.flush()
+                self._map = mmap.mmap(
+                    self._file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            self._expand(self._map[offset : offset + length], output)
+        output.write(data[position:])
+
+    def close(self) -> None:
+        """Close and remove the spool file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self.path.unlink(missing_ok=True)
@@ -0,0 +1,76 @@
+"""
+Shared pool of worker processes for GéraldMag.
+
+CPU-bound steps of a build (SCSS compilation, Markdown conversion, figure
+rendering) run in worker processes. Starting a pool costs an interpreter
+and its imports per worker, so a build starts one pool, on first use, and
+all its steps share it; the workers of the build daemon keep theirs from a
+job to the next.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+
+
+def _exit_with_parent(parent: int) -> None:
+    """
+    Stop a worker process when the process that started it dies.
+
+    Idle workers wait for work forever: those of a killed daemon worker
+    would outlive it.
+
+    Args:
+        parent: PID of the process owning the pool
+    """
+
+    def watch() -> None:
+        while os.getppid() == parent:
+            time.sleep(1)
+        os._exit(1)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+class WorkerPool:
+    """
+    Process pool shared by the steps of a build, started on first use.
+    """
+
+    def __init__(self, workers: int = 0):
+        """
+        Initialize the pool, without starting any process.
+
+        Args:
+            workers: Number of worker processes, 0 for the number of CPUs
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> Executor:
+        """Return the process pool, starting it if needed."""
+        with self._lock:
+            if self._executor is None:
+                # Spawned rather than forked, builds run their stages in
+                # threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_exit_with_parent,
+                    initargs=(os.getpid(),),
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker processes, if they were started.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
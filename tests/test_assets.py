@@ -0,0 +1,59 @@
+"""
+Tests of the compilation of styles and of their assets.
+"""
+
+from pathlib import Path
+
+from geraldmag.assets import FontBucket, ImageBucket, StyleCompiler
+
+
+def test_scoped_at_rules_stay_valid(tmp_path: Path):
+    """At-rules without rules are taken out of the scope selector."""
+    style = tmp_path / "style.scss"
+    style.write_text(
+        "$margin: 2cm;\n"
+        '@font-face { font-family: House; src: url("house.woff2"); }\n'
+        '@page { margin: $margin; @top-center { content: "Title"; } }\n'
+        "@media print { p { color: black; } }\n"
+        "p { color: blue; }\n",
+        encoding="utf-8",
+    )
+    styles = StyleCompiler()
+    styles.add_style(style, "abc")
+
+    css = " ".join(styles.compile_style(0).split())
+
+    assert css.count('[data-scope="abc"]') == 2
+    assert "@font-face { font-family: House;" in css
+    assert "@page { margin: 2cm; @top-center {" in css
+    assert '@media print { [data-scope="abc"] p {' in css
+
+
+def test_fonts_with_the_same_name_do_not_collide(tmp_path: Path):
+    """Fonts are registered by path, not by file name."""
+    styles = StyleCompiler()
+    styles.images = ImageBucket()
+    styles.fonts = FontBucket()
+    for name in ("one", "two"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "Regular.woff2").write_bytes(name.encode())
+        style = tmp_path / name / "style.css"
+        style.write_text(
+            '@font-face { font-family: F; src: url("Regular.woff2"); }\n',
+            encoding="utf-8",
+        )
+        styles.add_style(style)
+
+    urls = [
+        styles.compile_style(index).split('url("../fonts/')[1].split('"')[0]
+        for index in range(2)
+    ]
+
+    assert urls[0] != urls[1]
+    assert [styles.fonts.lookup(url) for url in urls] == [
+        tmp_path / "one" / "Regular.woff2",
+        tmp_path / "two" / "Regular.woff2",
+    ]
+    assert styles.fonts.register_font(tmp_path / "one" / "Regular.woff2") == (
+        urls[0]
+    )
@@ -0,0 +1,53 @@
+"""
+Tests of whole builds, which need WeasyPrint and its native libraries.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from geraldmag.builder import Builder
+from geraldmag.commands.build import create_environment
+
+try:
+    import weasyprint  # noqa: F401
+except (ImportError, OSError):  # pragma: no cover - missing Pango
+    weasyprint = None
+
+pytestmark = pytest.mark.skipif(
+    weasyprint is None, reason="WeasyPrint cannot be loaded"
+)
+
+
+def test_markdown_articles_are_sliced(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    """A publication of two Markdown articles gives two article PDFs."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "mag.toml").write_text('title = "Test"\n', encoding="utf-8")
+    publication = tmp_path / "content" / "mag"
+    for name, title in (("one", "First article"), ("two", "Second article")):
+        article = publication / "articles" / name
+        article.mkdir(parents=True)
+        (article / "index.md").write_text(
+            f"---\ntitle: {title}\n---\n\n# {title}\n\nSome text.\n",
+            encoding="utf-8",
+        )
+    (publication / "index.html").write_text(
+        "<html><body>\n"
+        "{% content 'mag/articles/one/index.md' %}\n"
+        '<div style="break-before: page"></div>\n'
+        "{% content 'mag/articles/two/index.md' %}\n"
+        "</body></html>\n",
+        encoding="utf-8",
+    )
+
+    builder = Builder(env=create_environment("mag", split_articles=True))
+    output = builder.build()
+
+    assert output.exists()
+    assert len(builder.context.articles) == 2
+    assert len(builder.article_files) == 2
+    for path in builder.article_files:
+        assert path.exists()
+        assert path.read_bytes().startswith(b"%PDF")
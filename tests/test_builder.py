@@ -0,0 +1,42 @@
+"""
+Tests of the builder steps that do not need WeasyPrint.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from geraldmag.builder import Builder
+from geraldmag.commands.build import create_environment
+
+
+def test_clean_removes_the_outputs_of_the_publication(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Cleaning removes the build and outputs, not the artifact cache."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "mag.toml").write_text(
+        'title = "Test"\noutput_profiles = ["print", "proof"]\n',
+        encoding="utf-8",
+    )
+    (tmp_path / "content" / "mag").mkdir(parents=True)
+    builder = Builder(env=create_environment("mag"))
+    kept = [
+        tmp_path / ".build" / ".cache" / "ab" / "abcd",
+        tmp_path / "out" / "other.pdf",
+    ]
+    removed = [
+        builder.build_path / "index.html",
+        *builder.output_files.values(),
+        tmp_path / "out" / "mag-print-articles" / "1-article.pdf",
+        *builder.report_files,
+    ]
+    for path in kept + removed:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+
+    builder.clean()
+
+    assert [path for path in kept if not path.exists()] == []
+    assert [path for path in removed if path.exists()] == []
+    assert not builder.build_path.exists()
@@ -0,0 +1,88 @@
+"""
+Tests of the data processor and of its chunks in the low-memory spool.
+"""
+
+import io
+from pathlib import Path
+
+import pytest
+
+from geraldmag.commands.build import create_environment
+from geraldmag.context import Context, PageContext
+from geraldmag.processors.data import DataProcessor
+
+ROW = "<tr><td>{{ row.name }}</td><td>{{ row.price }}</td></tr>\n"
+
+
+@pytest.fixture
+def publication(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a project with an empty publication."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "mag.toml").write_text('title = "Test"\n', encoding="utf-8")
+    publication = tmp_path / "content" / "mag"
+    publication.mkdir(parents=True)
+    (publication / "ads.row.html").write_text(ROW, encoding="utf-8")
+    return publication
+
+
+def _context(**options) -> PageContext:
+    """Create the page context of a data file of the publication."""
+    env = create_environment("mag")
+    for name, value in options.items():
+        setattr(env, name, value)
+    return PageContext(Context(env, "mag"))
+
+
+def test_table_rows_are_chunked_and_cached(publication: Path):
+    """Table rows are chunked, and the chunks come back from the cache."""
+    data = publication / "ads.jsonl"
+    data.write_text(
+        "".join(f'{{"name": "Ad {i}", "price": {i}}}\n' for i in range(5)),
+        encoding="utf-8",
+    )
+    context = _context(data_chunk_rows=2)
+
+    html = DataProcessor().process(data, context)
+    assert html.count('<tbody class="data-chunk"') == 3
+    assert 'data-rows="5-5"' in html and html.count("</table>") == 1
+
+    hits = context.cache.hits
+    assert DataProcessor().process(data, context) == html
+    # The number of pieces, then the five pieces
+    assert context.cache.hits == hits + 6
+
+
+def test_table_rows_need_the_same_columns(publication: Path):
+    """A table row with other columns than the first one is refused."""
+    data = publication / "ads.jsonl"
+    data.write_text(
+        '{"name": "Ad", "price": 1}\n{"name": "Ad", "cost": 2}\n',
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError, match="Row 2 .*missing: price"):
+        DataProcessor().process(data, _context())
+
+
+def test_chunks_are_spooled_one_by_one(publication: Path):
+    """In low-memory mode, chunks are spooled and expanded back in place."""
+    data = publication / "ads.csv"
+    data.write_text(
+        "name,price\n" + "".join(f"Ad {i},{i}\n" for i in range(4)),
+        encoding="utf-8",
+    )
+    context = _context(data_chunk_rows=1, low_memory=True)
+    spool = context.spool
+    assert spool is not None
+    context.spool = None
+    expected = DataProcessor().process(data, context)
+    context.spool = spool
+
+    html = DataProcessor().process(data, context)
+    # The fragment of the include holds the placeholders of the chunks
+    placeholder = spool.spill(html)
+    output = io.BytesIO()
+    spool.write_expanded([f"<body>{placeholder}</body>"], output)
+    spool.close()
+
+    assert spool.spilled == 7
+    assert output.getvalue().decode("utf-8") == f"<body>{expected}</body>"
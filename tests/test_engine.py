@@ -0,0 +1,50 @@
+"""
+Tests of the memoization of repeated content includes.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from geraldmag.commands.build import create_environment
+from geraldmag.context import Context
+from geraldmag.engine import ContentExtension, Engine
+
+
+@pytest.fixture
+def entrypoint(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a publication including the same article twice."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "mag.toml").write_text('title = "Test"\n', encoding="utf-8")
+    publication = tmp_path / "content" / "mag"
+    publication.mkdir(parents=True)
+    (publication / "article.md").write_text(
+        "---\ntitle: Article\nstyle: style.css\n---\n\nSome text.\n",
+        encoding="utf-8",
+    )
+    (publication / "style.css").write_text("p { color: red; }\n")
+    entrypoint = publication / "index.html"
+    entrypoint.write_text(
+        "{% content 'mag/article.md' %}\n{% content 'mag/article.md' %}\n",
+        encoding="utf-8",
+    )
+    return entrypoint
+
+
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_repeated_include_reuses_its_scope(entrypoint: Path, low_memory):
+    """Both includes are articles with one scope and one style."""
+    env = create_environment("mag")
+    env.low_memory = low_memory
+    context = Context(env, "mag")
+    engine = Engine(context)
+
+    engine.process(entrypoint)
+
+    assert [article.title for article in context.articles] == ["Article"] * 2
+    assert len(context.styles.usage()) == 1
+    assert list(context.styles.usage().values())[0][0] == 1
+    extension = engine.env.extensions[ContentExtension.identifier]
+    assert isinstance(extension, ContentExtension)
+    # Low-memory mode keeps no content of the includes
+    assert bool(extension._fragments) is not low_memory
@@ -0,0 +1,52 @@
+"""
+Tests of the hyphenation pre-pass and of its cache.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from geraldmag.commands.build import create_environment
+from geraldmag.context import Context
+from geraldmag.engine import Engine
+from geraldmag.hyphenation import SOFT_HYPHEN, Hyphenator
+
+
+def _render(entrypoint: Path) -> str:
+    """Render the HTML of the publication, as a build does."""
+    context = Context(create_environment("mag"), "mag")
+    return Engine(context).process(entrypoint)
+
+
+def test_second_build_hits_the_cache(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Scopes, image URLs and anchors change, the hyphenation is reused."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "mag.toml").write_text(
+        'title = "Test"\nhyphenation = "en"\n', encoding="utf-8"
+    )
+    publication = tmp_path / "content" / "mag"
+    publication.mkdir(parents=True)
+    (publication / "picture.png").write_bytes(b"")
+    (publication / "article.md").write_text(
+        "# Hyphenation\n\nExtraordinary typographical considerations.\n\n"
+        "![Picture](picture.png)\n",
+        encoding="utf-8",
+    )
+    entrypoint = publication / "index.html"
+    entrypoint.write_text(
+        "<html><body>{% content 'mag/article.md' %}</body></html>",
+        encoding="utf-8",
+    )
+
+    first = _render(entrypoint)
+    assert SOFT_HYPHEN in first
+
+    def lookup(self: Hyphenator, match):
+        raise AssertionError(f"{match[0]} looked up again")
+
+    monkeypatch.setattr(Hyphenator, "_hyphenate_word", lookup)
+    second = _render(entrypoint)
+    assert second != first
+    assert second.count(SOFT_HYPHEN) == first.count(SOFT_HYPHEN)
@@ -0,0 +1,42 @@
+"""
+Tests of the project initialization from a template set.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from geraldmag.commands.init import init_project
+
+
+@pytest.fixture
+def template(tmp_path: Path) -> Path:
+    """Create a template set shipping its own mag.toml."""
+    template = tmp_path / "house"
+    (template / "content" / "house").mkdir(parents=True)
+    (template / "mag.toml").write_text('title = "House"\n', encoding="utf-8")
+    (template / "content" / "house" / "index.html").write_text(
+        "<html></html>\n", encoding="utf-8"
+    )
+    return template
+
+
+@pytest.mark.parametrize("force", [False, True])
+def test_template_files_win_over_defaults(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    template: Path,
+    force: bool,
+):
+    """The template's mag.toml is kept, the missing defaults are written."""
+    project = tmp_path / "project"
+    project.mkdir()
+    monkeypatch.chdir(project)
+
+    init_project(force, template)
+
+    mag_toml = (project / "mag.toml").read_text(encoding="utf-8")
+    assert mag_toml == 'title = "House"\n'
+    assert (project / "content" / "house" / "index.html").exists()
+    assert (project / "content" / "_default" / "styles" / "main.css").exists()
+    assert (project / ".gitignore").exists()
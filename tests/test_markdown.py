@@ -0,0 +1,81 @@
+"""
+Tests of the splitting of large Markdown documents.
+"""
+
+from geraldmag.processors.markdown import _convert, split_markdown
+
+DOCUMENT = """\
+Introduction, see [the manual][manual] and [Setext].
+
+# First part
+
+Text of the first part, with a [shared link][shared].
+
+```python
+# Not a heading
+x = 1
+```
+
+A multi-line
+setext heading
+==============
+
+More text.
+
+Single line
+===========
+
+## Second part
+
+Another [shared link][SHARED] and a paragraph
+that goes on.
+
+Setext heading
+of level 2
+----------
+
+* * *
+
+# Third part
+
+No references here.
+
+[manual]: https://example.com/manual "The manual"
+[shared]: https://example.com/shared
+[setext]: https://example.com/setext
+[unused]: https://example.com/unused
+"""
+
+
+def test_chunks_convert_like_the_whole_document():
+    """Converting the chunks gives the HTML of the whole document."""
+    chunks = split_markdown(DOCUMENT, 0)
+    assert len(chunks) == 4
+    assert "\n".join(_convert(chunk) for chunk in chunks) == _convert(DOCUMENT)
+
+
+def test_setext_headings_are_not_split():
+    """Setext underlines stay in the chunk of the text above them."""
+    chunks = split_markdown(DOCUMENT, 0)
+    for heading in (
+        "A multi-line\nsetext heading\n===",
+        "Setext heading\nof level 2\n---",
+        "Single line\n===",
+    ):
+        assert any(heading in chunk for chunk in chunks)
+
+
+def test_chunks_only_carry_their_references():
+    """A chunk only changes with the definitions it refers to."""
+    chunks = split_markdown(DOCUMENT, 0)
+    assert "[manual]:" in chunks[0] and "[shared]:" not in chunks[0]
+    assert "[shared]:" in chunks[1] and "[shared]:" in chunks[2]
+    assert not any("[unused]:" in chunk for chunk in chunks)
+
+    edited = DOCUMENT.replace("/manual", "/handbook")
+    assert split_markdown(edited, 0)[1:] == chunks[1:]
+
+
+def test_small_sections_are_glued():
+    """Sections smaller than the minimum size join the next one."""
+    assert len(split_markdown(DOCUMENT, 10**6)) == 1
@@ -0,0 +1,98 @@
+"""
+Tests of the pre-flight checks.
+"""
+
+import pickle
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from geraldmag.commands.build import create_environment
+from geraldmag.commands.serve import _job_error
+from geraldmag.context import Context
+from geraldmag.engine import Engine
+from geraldmag.preflight import Preflight, PreflightError
+
+
+@pytest.fixture
+def publication(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a project with a publication of one Markdown article."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "mag.toml").write_text('title = "Test"\n', encoding="utf-8")
+    publication = tmp_path / "content" / "mag"
+    (publication / "article").mkdir(parents=True)
+    (publication / "article" / "index.md").write_text(
+        "---\ntitle: Article\nstyle: style.scss\n---\n\n# Article\n",
+        encoding="utf-8",
+    )
+    (publication / "article" / "style.scss").write_text("", encoding="utf-8")
+    (publication / "index.html").write_text(
+        "<html><body>\n{% content 'mag/article/index.md' %}\n</body></html>\n",
+        encoding="utf-8",
+    )
+    return publication
+
+
+def _issues() -> List[str]:
+    """Run the pre-flight checks of the publication."""
+    engine = Engine(Context(create_environment("mag"), "mag"))
+    return [issue.message for issue in Preflight(engine).run()]
+
+
+def test_buildable_publication(publication: Path):
+    """A publication whose files all exist has no issue."""
+    assert _issues() == []
+
+
+def test_missing_files(publication: Path):
+    """Missing content, images and style resources are reported."""
+    (publication / "index.html").write_text(
+        "{% content 'mag/article/index.md' %}\n{% content 'mag/gone.md' %}\n",
+        encoding="utf-8",
+    )
+    article = publication / "article"
+    with (article / "index.md").open("a", encoding="utf-8") as f:
+        f.write("\n![Photo](photo.jpg)\n")
+    (article / "style.scss").write_text(
+        "h1 { background: url('texture.png'); }\n", encoding="utf-8"
+    )
+
+    issues = _issues()
+
+    assert any(issue.startswith("Content not found:") for issue in issues)
+    assert "Image not found: photo.jpg" in issues
+    assert "Resource not found: texture.png" in issues
+
+
+def test_sass_expressions_are_not_checked(publication: Path):
+    """URLs computed by Sass are left to the compiler."""
+    (publication / "article" / "style.scss").write_text(
+        '$image: "texture.png";\n'
+        "h1 { background: url($image); }\n"
+        "h2 { background: url(image-url($image)); }\n"
+        'h3 { background: url($dir+"/texture.png"); }\n'
+        'h4 { background: url("#{$dir}/texture.png"); }\n',
+        encoding="utf-8",
+    )
+    assert _issues() == []
+
+
+def test_error_survives_worker_processes(publication: Path):
+    """Issues come back whole from a worker process of the daemon."""
+    (publication / "index.html").write_text(
+        "{% content 'mag/one.md' %}\n{% content 'mag/two.md' %}\n",
+        encoding="utf-8",
+    )
+    engine = Engine(Context(create_environment("mag"), "mag"))
+    error = PreflightError(Preflight(engine).run())
+
+    copy = pickle.loads(pickle.dumps(error))
+
+    assert str(copy) == "Pre-flight checks failed with 2 issue(s)"
+    assert [str(issue) for issue in copy.issues] == [
+        str(issue) for issue in error.issues
+    ]
+    message = _job_error(copy).splitlines()
+    assert message[0] == f"PreflightError: {error}"
+    assert len(message) == 3 and "mag/one.md" in message[1]
@@ -0,0 +1,29 @@
+"""
+Tests of the output profiles.
+"""
+
+import pytest
+
+from geraldmag import profiles
+from geraldmag.env import Environment
+
+
+def test_web_profile_without_pikepdf(
+    monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+):
+    """Without pikepdf, linearized profiles are written as is."""
+    monkeypatch.setattr(profiles, "pikepdf", None)
+    env = Environment(output_profiles=["web", "print"])
+
+    web, print_profile = profiles.get_profiles(env)
+
+    assert not web.linearize
+    assert web.dpi == 150
+    assert print_profile.full_fonts
+    assert "'web' is not linearized" in capsys.readouterr().out
+
+
+def test_unknown_profile():
+    """Unknown profiles are refused."""
+    with pytest.raises(ValueError, match="Unknown output profile"):
+        profiles.get_profiles(Environment(output_profiles=["poster"]))
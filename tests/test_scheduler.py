@@ -0,0 +1,49 @@
+"""
+Tests of the build stage timings.
+"""
+
+import asyncio
+import time
+from typing import Dict, Tuple
+
+from geraldmag.scheduler import TaskGraph, stage_timeline
+
+
+def test_stage_timeline_is_relative_and_ordered():
+    """Stages are listed in start order, from the start of the first."""
+    timings = {
+        "pdf": (12.0, 15.0),
+        "html": (10.0, 11.5),
+        "styles": (10.5, 12.0),
+    }
+    assert stage_timeline(timings) == [
+        ("html", 0.0, 1.5),
+        ("styles", 0.5, 2.0),
+        ("pdf", 2.0, 5.0),
+    ]
+
+
+def test_stage_timeline_of_no_stage():
+    """A build without stages has an empty timeline."""
+    assert stage_timeline({}) == []
+
+
+def test_timings_snapshot_from_a_task():
+    """A task gets a copy of the timings, taken on the event loop thread."""
+
+    async def run() -> Dict[str, Tuple[float, float]]:
+        graph = TaskGraph(max_workers=4)
+        try:
+            graph.add("first", time.sleep, 0)
+            for index in range(20):
+                graph.add(f"other-{index}", time.sleep, 0.01)
+            graph.add("report", graph.timings_snapshot, deps=["first"])
+            snapshot = (await graph.wait("report"))[0]
+            await graph.join()
+            assert snapshot is not graph.timings
+            return snapshot
+        finally:
+            graph.close()
+
+    snapshot = asyncio.run(run())
+    assert "first" in snapshot and "report" not in snapshot
@@ -0,0 +1,66 @@
+"""
+Tests of the job API of the build daemon.
+"""
+
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import pytest
+
+from geraldmag.commands.serve import Job, JobQueue, JobRequestHandler
+
+
+@pytest.fixture
+def daemon(tmp_path: Path) -> Iterator[Tuple[str, JobQueue]]:
+    """Serve a job queue on a free local port."""
+    jobs = JobQueue(1)
+
+    class Handler(JobRequestHandler):
+        pass
+
+    Handler.jobs = jobs
+    Handler.project = str(tmp_path)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", jobs
+    finally:
+        server.shutdown()
+        server.server_close()
+        jobs.shutdown()
+
+
+def _finished_job(jobs: JobQueue, output: Path) -> Job:
+    """Record a finished job whose PDF is a file."""
+    job = Job(publication="mag", project=str(output.parent), status="done")
+    job.report = {"output": str(output)}
+    with jobs._lock:
+        jobs._jobs[job.id] = job
+    return job
+
+
+def test_pdf_is_streamed(daemon: Tuple[str, JobQueue], tmp_path: Path):
+    """The PDF of a finished job is sent whole, with its length."""
+    url, jobs = daemon
+    output = tmp_path / "mag.pdf"
+    output.write_bytes(b"%PDF-" + bytes(range(256)) * 10000)
+    job = _finished_job(jobs, output)
+
+    with urllib.request.urlopen(f"{url}/jobs/{job.id}/pdf") as response:
+        assert response.headers["Content-Length"] == str(output.stat().st_size)
+        assert response.read() == output.read_bytes()
+
+    output.unlink()
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"{url}/jobs/{job.id}/pdf")
+    assert error.value.code == 404
+
+
+def test_cancel_forgotten_job(daemon: Tuple[str, JobQueue]):
+    """Cancelling a job that is no longer known does not fail."""
+    _, jobs = daemon
+    assert jobs.cancel("forgotten") is False